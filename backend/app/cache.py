@@ -0,0 +1,95 @@
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# Maximum number of cached query results kept in memory.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+# Maximum number of rows held across all cached results; list results weigh
+# one per row so a few huge pages cannot pin unbounded memory.
+QUERY_CACHE_MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", "50000"))
+
+
+class VersionedCache:
+    """
+    In-process LRU cache for read queries, invalidated by data version counters.
+
+    Every cached result is keyed by ``(table, project_id, params, version)``.
+    Writers call ``bump(table, project_id)`` after committing, which makes all
+    earlier entries for that table and project unreachable; they are then
+    evicted by the LRU policy instead of being searched for and deleted.
+    Project-independent tables (``projects``) use ``project_id=None``.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, max_rows: int = QUERY_CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.rows = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._versions: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, table: str, project_id: Optional[int] = None) -> int:
+        return self._versions.get((table, project_id), 0)
+
+    def bump(self, table: str, project_id: Optional[int] = None) -> int:
+        key = (table, project_id)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return self._versions[key]
+
+    async def get_or_load(
+        self,
+        table: str,
+        project_id: Optional[int],
+        params: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return the cached result for this query or run ``loader`` and cache it.
+
+        Cached values are shared between callers and must be treated as read-only.
+        """
+        if self.max_entries <= 0:
+            return await loader()
+        key = (table, project_id, params, self.version(table, project_id))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        value = await loader()
+        weight = len(value) if isinstance(value, list) else 1
+        if weight > self.max_rows:
+            return value
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.rows -= old[1]
+        self._entries[key] = (value, weight)
+        self.rows += weight
+        while len(self._entries) > self.max_entries or self.rows > self.max_rows:
+            _, (_, evicted_weight) = self._entries.popitem(last=False)
+            self.rows -= evicted_weight
+            self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.rows = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "rows": self.rows,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+query_cache = VersionedCache()
@@ -1,7 +1,13 @@
 import aiosqlite
-import json
+import asyncio
 import os
+import re
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from .metrics import db_query_duration
 
 # Database path
 try:
@@ -13,12 +19,140 @@ DATA_DIR = os.getenv("DATA_DIR", ROOT_DIR / "data")
 Path(DATA_DIR).mkdir(exist_ok=True)
 DB_FILE = Path(DATA_DIR) / "platform.db"
 
-async def get_db_connection():
-    """Creates an async connection to the SQLite database."""
+# Number of read-only connections kept open by the pool. Writes always go
+# through a single dedicated connection, which matches SQLite's one-writer model.
+DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", "4"))
+
+# Pragmas applied to every pooled connection. WAL lets readers proceed while the
+# writer commits; NORMAL sync is durable across application crashes in WAL mode.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 268435456",
+)
+
+async def _open_connection(readonly: bool = False) -> aiosqlite.Connection:
     conn = await aiosqlite.connect(DB_FILE)
     conn.row_factory = aiosqlite.Row  # Use aiosqlite's Row factory
+    for pragma in CONNECTION_PRAGMAS:
+        async with conn.execute(pragma):
+            pass
+    if readonly:
+        async with conn.execute("PRAGMA query_only = ON"):
+            pass
     return conn
 
+async def get_db_connection():
+    """Creates an async connection to the SQLite database."""
+    return await _open_connection()
+
+
+class ConnectionPool:
+    """
+    Long-lived aiosqlite connections shared by all storage functions.
+
+    One writer connection is guarded by a lock so that write transactions are
+    serialised in-process instead of failing with ``database is locked``. A
+    fixed set of reader connections is handed out through a queue.
+    """
+
+    def __init__(self, readers: int = DB_POOL_READERS):
+        self.size = max(1, readers)
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def open(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._writer = await _open_connection()
+        async with self._writer.execute("PRAGMA journal_mode = WAL"):
+            pass
+        for _ in range(self.size):
+            conn = await _open_connection(readonly=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self) -> None:
+        async with self._write_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Yield the writer inside a transaction; commit on success, roll back on error."""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+
+
+_pool: Optional[ConnectionPool] = None
+
+async def open_pool(readers: int = DB_POOL_READERS) -> ConnectionPool:
+    """Open the shared connection pool. Called from the application startup hook."""
+    global _pool
+    if _pool is None:
+        pool = ConnectionPool(readers)
+        await pool.open()
+        _pool = pool
+    return _pool
+
+async def close_pool() -> None:
+    """Close the shared connection pool. Called from the application shutdown hook."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+@asynccontextmanager
+async def db_connection(write: bool = False, op: str = "other") -> AsyncIterator[aiosqlite.Connection]:
+    """
+    Borrow a connection from the pool.
+
+    ``write=True`` yields the single writer connection and wraps the block in a
+    transaction. When the pool has not been opened, or the caller runs on another
+    event loop (scripts, worker threads), a short-lived connection is used instead.
+    The time from asking for the connection to releasing it is recorded in
+    ``db_query_duration_seconds`` under ``op``.
+    """
+    started = time.perf_counter()
+    try:
+        if _pool is not None and _pool._loop is asyncio.get_running_loop():
+            ctx = _pool.writer() if write else _pool.reader()
+            async with ctx as conn:
+                yield conn
+            return
+        conn = await _open_connection()
+        try:
+            yield conn
+            if write:
+                await conn.commit()
+        finally:
+            await conn.close()
+    finally:
+        db_query_duration.observe((op,), time.perf_counter() - started)
+
 async def init_db():
     """Initializes the database and creates tables if they don't exist."""
     async with aiosqlite.connect(DB_FILE) as conn:
@@ -29,7 +163,8 @@ async def init_db():
             name TEXT NOT NULL,
             description TEXT,
             owner TEXT,
-            status TEXT
+            status TEXT,
+            deleting INTEGER NOT NULL DEFAULT 0
         );
         """)
 
@@ -48,7 +183,7 @@ async def init_db():
             result TEXT,
             note TEXT,
             review TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
+            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
         );
         """)
 
@@ -67,7 +202,7 @@ async def init_db():
             result TEXT,
             note TEXT,
             review TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
+            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
         );
         """)
 
@@ -90,7 +225,7 @@ async def init_db():
             summary TEXT,
             note TEXT,
             review TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
+            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
         );
         """)
 
@@ -107,7 +242,7 @@ async def init_db():
             actual TEXT,
             note TEXT,
             screenshot TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
+            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
         );
         """)
 
@@ -123,7 +258,12 @@ async def init_db():
             response_status INTEGER,
             response_headers TEXT, -- Stored as JSON string
             response_body TEXT,
-            delay_ms INTEGER
+            delay_ms INTEGER,
+            latency_profile TEXT, -- Stored as JSON string
+            bandwidth_kbps INTEGER,
+            faults TEXT, -- Stored as JSON string
+            body_file TEXT, -- Path relative to DATA_DIR, served instead of response_body
+            body_match TEXT -- Stored as JSON string
         );
         """)
 
@@ -132,8 +272,339 @@ async def init_db():
         CREATE TABLE IF NOT EXISTS app_device_info (
             project_id INTEGER PRIMARY KEY,
             device_info TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects (id)
+            FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
         );
         """)
 
         await conn.commit()
+        await run_migrations(conn)
+
+        global FTS_TOKENIZER
+        FTS_TOKENIZER = await _load_fts_tokenizer(conn)
+        await load_schema(conn)
+
+# ---- Schema registry ----
+class TableSchema:
+    """
+    Column metadata for one table plus cached INSERT/UPDATE statements.
+
+    Statements are keyed by the tuple of columns being written, so a spreadsheet
+    editing session that keeps saving the same fields reuses one SQL string.
+    """
+
+    def __init__(self, name: str, columns: list):
+        self.name = name
+        self.columns = tuple(columns)
+        self.column_set = frozenset(columns)
+        self._insert_sql: dict = {}
+        self._update_sql: dict = {}
+
+    def writable(self, data: dict, exclude: tuple = ()) -> dict:
+        """Keep only keys that are real columns of this table."""
+        return {k: v for k, v in data.items() if k in self.column_set and k not in exclude}
+
+    def insert_sql(self, columns: tuple) -> str:
+        sql = self._insert_sql.get(columns)
+        if sql is None:
+            placeholders = ", ".join("?" for _ in columns)
+            sql = f"INSERT INTO {self.name} ({', '.join(columns)}) VALUES ({placeholders})"
+            self._insert_sql[columns] = sql
+        return sql
+
+    def update_sql(self, columns: tuple, id_field: str = "id") -> str:
+        key = (columns, id_field)
+        sql = self._update_sql.get(key)
+        if sql is None:
+            set_clause = ", ".join(f"{c} = ?" for c in columns)
+            sql = f"UPDATE {self.name} SET {set_clause} WHERE {id_field} = ? AND project_id = ?"
+            self._update_sql[key] = sql
+        return sql
+
+SCHEMA: dict[str, TableSchema] = {}
+
+async def _read_table_schema(conn: aiosqlite.Connection, table_name: str) -> TableSchema:
+    async with conn.execute(f"PRAGMA table_info({table_name})") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    return TableSchema(table_name, columns)
+
+async def load_schema(conn: aiosqlite.Connection) -> None:
+    """(Re)build the registry from the catalog. Run after migrations change tables."""
+    async with conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '%_fts%'"
+    ) as cursor:
+        names = [row[0] for row in await cursor.fetchall()]
+    registry = {}
+    for name in names:
+        registry[name] = await _read_table_schema(conn, name)
+    SCHEMA.clear()
+    SCHEMA.update(registry)
+
+async def table_schema(conn: aiosqlite.Connection, table_name: str) -> TableSchema:
+    """Return the cached schema, reading the catalog only if ``init_db`` has not run."""
+    schema = SCHEMA.get(table_name)
+    if schema is None:
+        schema = await _read_table_schema(conn, table_name)
+        SCHEMA[table_name] = schema
+    return schema
+
+# ---- Schema migrations ----
+# Each migration upgrades the schema by one version and is applied at most once.
+# The applied version is tracked in ``PRAGMA user_version`` so no bookkeeping
+# table is needed. Append new migrations to ``MIGRATIONS``; never edit old ones.
+
+PROJECT_INDEXES = (
+    # Plain project index keeps rows in id order for paginated listings.
+    "CREATE INDEX IF NOT EXISTS idx_web_cases_project ON web_cases (project_id)",
+    "CREATE INDEX IF NOT EXISTS idx_web_cases_feature_step ON web_cases (project_id, test_feature, test_step)",
+    "CREATE INDEX IF NOT EXISTS idx_web_cases_result ON web_cases (project_id, result)",
+    "CREATE INDEX IF NOT EXISTS idx_web_cases_action ON web_cases (project_id, action)",
+    "CREATE INDEX IF NOT EXISTS idx_app_cases_project ON app_cases (project_id)",
+    "CREATE INDEX IF NOT EXISTS idx_app_cases_feature_step ON app_cases (project_id, test_feature, test_step)",
+    "CREATE INDEX IF NOT EXISTS idx_app_cases_result ON app_cases (project_id, result)",
+    "CREATE INDEX IF NOT EXISTS idx_app_cases_action ON app_cases (project_id, action)",
+    "CREATE INDEX IF NOT EXISTS idx_api_cases_project ON api_cases (project_id)",
+    "CREATE INDEX IF NOT EXISTS idx_api_cases_feature_step ON api_cases (project_id, test_feature, step)",
+    "CREATE INDEX IF NOT EXISTS idx_api_cases_result ON api_cases (project_id, result)",
+    "CREATE INDEX IF NOT EXISTS idx_api_cases_method ON api_cases (project_id, method)",
+    "CREATE INDEX IF NOT EXISTS idx_bugs_status_severity ON bugs (project_id, status, severity)",
+    "CREATE INDEX IF NOT EXISTS idx_bugs_severity ON bugs (project_id, severity)",
+)
+
+async def _migration_1_project_indexes(conn: aiosqlite.Connection) -> None:
+    """Index the project-scoped tables for list, filter and grouping queries."""
+    for statement in PROJECT_INDEXES:
+        await conn.execute(statement)
+
+# Columns covered by the full-text index of each searchable table.
+SEARCH_COLUMNS = {
+    "web_cases": ("test_feature", "description"),
+    "app_cases": ("test_feature", "description"),
+    "api_cases": ("test_feature", "summary"),
+    "bugs": ("description", "repro", "expected", "actual"),
+}
+
+# Tokenizer used by the ``<table>_fts`` tables, or None when FTS5 is unavailable
+# and searches fall back to LIKE. Set by ``init_db``.
+FTS_TOKENIZER: Optional[str] = None
+
+async def _probe_fts_tokenizer(conn: aiosqlite.Connection) -> Optional[str]:
+    """
+    Pick the best FTS5 tokenizer this SQLite build supports.
+
+    ``trigram`` (SQLite 3.34+) matches any substring, which suits Chinese text
+    that has no word separators. ``unicode61`` is the fallback for older builds.
+    """
+    for tokenizer in ("trigram", "unicode61"):
+        try:
+            await conn.execute(f"CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize='{tokenizer}')")
+        except Exception:
+            continue
+        await conn.execute("DROP TABLE temp._fts_probe")
+        return tokenizer
+    return None
+
+async def _create_fts_triggers(conn: aiosqlite.Connection, table: str) -> None:
+    fts = f"{table}_fts"
+    columns = SEARCH_COLUMNS[table]
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    await conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_vals});
+    END;
+    """)
+    await conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+    END;
+    """)
+    await conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_vals});
+    END;
+    """)
+
+async def _migration_2_fts_search(conn: aiosqlite.Connection) -> None:
+    """Create external-content FTS5 indexes for cases and bugs, kept in sync by triggers."""
+    tokenizer = await _probe_fts_tokenizer(conn)
+    if tokenizer is None:
+        return
+    for table, columns in SEARCH_COLUMNS.items():
+        fts = f"{table}_fts"
+        cols = ", ".join(columns)
+        await conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+            f"content='{table}', content_rowid='id', tokenize='{tokenizer}')"
+        )
+        await _create_fts_triggers(conn, table)
+        # Index rows that existed before the migration.
+        await conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+# Tables whose rows belong to a project and are removed with it.
+PROJECT_CHILD_TABLES = ("web_cases", "app_cases", "api_cases", "bugs", "app_device_info")
+
+async def _migration_3_cascade_deletes(conn: aiosqlite.Connection) -> None:
+    """
+    Make project deletion cascade to project-scoped rows and add ``projects.deleting``.
+
+    SQLite cannot alter a foreign key in place, so each child table is rebuilt
+    from its own DDL with ``ON DELETE CASCADE`` and its rows copied over with the
+    same ids (keeping the FTS indexes valid). Indexes and FTS triggers, which are
+    dropped with the old table, are recreated. Tables created by a newer
+    ``init_db`` already cascade and are left alone.
+    """
+    async with conn.execute("PRAGMA table_info(projects)") as cursor:
+        project_columns = {row[1] for row in await cursor.fetchall()}
+    if "deleting" not in project_columns:
+        await conn.execute("ALTER TABLE projects ADD COLUMN deleting INTEGER NOT NULL DEFAULT 0")
+
+    for table in PROJECT_CHILD_TABLES:
+        async with conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)) as cursor:
+            row = await cursor.fetchone()
+        if row is None or "ON DELETE CASCADE" in row[0]:
+            continue
+        ddl = re.sub(r"REFERENCES\s+projects\s*\(\s*id\s*\)", "REFERENCES projects (id) ON DELETE CASCADE", row[0])
+        ddl = re.sub(rf"^CREATE TABLE\s+\"?{table}\"?", f"CREATE TABLE {table}__new", ddl)
+        await conn.execute(ddl)
+        await conn.execute(f"INSERT INTO {table}__new SELECT * FROM {table}")
+        await conn.execute(f"DROP TABLE {table}")
+        await conn.execute(f"ALTER TABLE {table}__new RENAME TO {table}")
+
+    for statement in PROJECT_INDEXES:
+        await conn.execute(statement)
+    if await _load_fts_tokenizer(conn):
+        for table in SEARCH_COLUMNS:
+            await _create_fts_triggers(conn, table)
+
+async def _migration_4_mock_revision(conn: aiosqlite.Connection) -> None:
+    """
+    Track a revision counter for the mocks table in ``meta``.
+
+    Triggers bump ``mocks_revision`` on every insert, update or delete, so mock
+    servers running in other processes can detect changes with one cheap query
+    instead of reloading every mock.
+    """
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)"
+    )
+    await conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('mocks_revision', 0)")
+    for suffix, event in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE")):
+        await conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS mocks_rev_{suffix} AFTER {event} ON mocks BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'mocks_revision';
+            END
+        """)
+
+async def _migration_5_mock_journal(conn: aiosqlite.Connection) -> None:
+    """Table receiving the mock server's request journal when persistence is enabled."""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS mock_journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            pid INTEGER,
+            method TEXT,
+            path TEXT,
+            query TEXT,
+            headers TEXT,
+            body_digest TEXT,
+            mock_id INTEGER,
+            status INTEGER,
+            latency_ms REAL
+        )
+    """)
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_mock_journal_ts ON mock_journal (ts)")
+
+async def _migration_6_mock_shaping(conn: aiosqlite.Connection) -> None:
+    """Add latency profiles and bandwidth caps to mocks."""
+    async with conn.execute("PRAGMA table_info(mocks)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "latency_profile" not in columns:
+        await conn.execute("ALTER TABLE mocks ADD COLUMN latency_profile TEXT")
+    if "bandwidth_kbps" not in columns:
+        await conn.execute("ALTER TABLE mocks ADD COLUMN bandwidth_kbps INTEGER")
+
+async def _migration_7_mock_faults(conn: aiosqlite.Connection) -> None:
+    """Add per-mock fault injection rules."""
+    async with conn.execute("PRAGMA table_info(mocks)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "faults" not in columns:
+        await conn.execute("ALTER TABLE mocks ADD COLUMN faults TEXT")
+
+async def _migration_8_mock_body_files(conn: aiosqlite.Connection) -> None:
+    """Let mocks serve a file under DATA_DIR instead of an inline body."""
+    async with conn.execute("PRAGMA table_info(mocks)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "body_file" not in columns:
+        await conn.execute("ALTER TABLE mocks ADD COLUMN body_file TEXT")
+
+async def _migration_9_mock_body_match(conn: aiosqlite.Connection) -> None:
+    """Add partial JSON body matchers (subset / JSONPath predicates)."""
+    async with conn.execute("PRAGMA table_info(mocks)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "body_match" not in columns:
+        await conn.execute("ALTER TABLE mocks ADD COLUMN body_match TEXT")
+
+async def _migration_10_mock_static_response(conn: aiosqlite.Connection) -> None:
+    """Let mocks serve their response body and headers verbatim (recorded mocks)."""
+    async with conn.execute("PRAGMA table_info(mocks)") as cursor:
+        columns = {row[1] for row in await cursor.fetchall()}
+    if "static_response" not in columns:
+        await conn.execute("ALTER TABLE mocks ADD COLUMN static_response INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS = [
+    (1, _migration_1_project_indexes),
+    (2, _migration_2_fts_search),
+    (3, _migration_3_cascade_deletes),
+    (4, _migration_4_mock_revision),
+    (5, _migration_5_mock_journal),
+    (6, _migration_6_mock_shaping),
+    (7, _migration_7_mock_faults),
+    (8, _migration_8_mock_body_files),
+    (9, _migration_9_mock_body_match),
+    (10, _migration_10_mock_static_response),
+]
+
+async def _load_fts_tokenizer(conn: aiosqlite.Connection) -> Optional[str]:
+    async with conn.execute("SELECT sql FROM sqlite_master WHERE name = 'web_cases_fts'") as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        return None
+    return "trigram" if "trigram" in row[0] else "unicode61"
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    async with conn.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0]
+
+async def run_migrations(conn: aiosqlite.Connection) -> int:
+    """
+    Apply every migration newer than the database's ``user_version``.
+
+    Each migration runs in its own transaction together with the version bump,
+    so a failure leaves the database at the last fully applied version.
+    Transactions take the write lock up front and re-check the version, so
+    several processes (e.g. mock server workers) can start at the same time.
+    Returns the resulting schema version.
+    """
+    current = await get_schema_version(conn)
+    for version, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = await get_schema_version(conn)
+            if version <= current:
+                await conn.rollback()
+                continue
+            await migrate(conn)
+            await conn.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+        current = version
+    # Refresh planner statistics so the new indexes are picked up immediately.
+    await conn.execute("PRAGMA optimize")
+    return current
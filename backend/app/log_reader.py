@@ -0,0 +1,198 @@
+"""
+Partial reads of run logs.
+
+A run log is read as one logical byte stream: its rotated ``.gz`` segments
+oldest first, then the live ``run.log`` (see ``log_rotation``). A segment's
+uncompressed size comes from the gzip trailer, so byte offsets can be mapped
+to segments without decompressing anything.
+
+``build_line_index`` runs when a test run finishes. It writes
+``run.log.idx``, which records the byte offset of every
+``LOG_INDEX_EVERY``-th line plus the segment sizes it was built from. With
+a current index, line ``N`` is reached by seeking to the nearest indexed line
+and skipping at most ``LOG_INDEX_EVERY - 1`` lines. Without one (the run is
+still writing, or the log changed since), lines are counted from the start;
+``tail`` then reads the live file backwards.
+"""
+import gzip
+import json
+import os
+import struct
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from .log_rotation import log_parts
+
+LOG_INDEX_EVERY = int(os.getenv("LOG_INDEX_EVERY", "1000"))
+_CHUNK = 64 * 1024
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def _part_size(part: str) -> int:
+    """Uncompressed size of one segment (gzip ISIZE, exact below 4 GiB)."""
+    if not part.endswith(".gz"):
+        return os.path.getsize(part)
+    with open(part, "rb") as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack("<I", f.read(4))[0]
+
+
+def _open_binary(part: str):
+    return gzip.open(part, "rb") if part.endswith(".gz") else open(part, "rb")
+
+
+class LogView:
+    """A run log and its segments, addressed by logical byte offset and line number."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # (part, logical start, size)
+        self.parts: List[Tuple[str, int, int]] = []
+        start = 0
+        for part in log_parts(path):
+            size = _part_size(part)
+            self.parts.append((part, start, size))
+            start += size
+        self.size = start
+        self.index = self._load_index()
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.parts)
+
+    @property
+    def total_lines(self) -> Optional[int]:
+        return self.index["lines"] if self.index else None
+
+    def _signature(self) -> list:
+        return [[os.path.basename(part), size] for part, _, size in self.parts]
+
+    def _load_index(self) -> Optional[dict]:
+        try:
+            with open(index_path(self.path), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Stale once the log grew or rotated after the index was written
+        return index if index.get("parts") == self._signature() else None
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Bytes ``start..end`` (inclusive) of the logical stream."""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        for part, part_start, size in self.parts:
+            part_end = part_start + size - 1
+            if part_end < start or part_start > end:
+                continue
+            with _open_binary(part) as f:
+                f.seek(max(0, start - part_start))
+                remaining = min(end, part_end) - max(start, part_start) + 1
+                while remaining > 0:
+                    chunk = f.read(min(_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+
+    def iter_lines(self, start: int = 0) -> Iterator[bytes]:
+        """Lines (with their newline) from logical byte offset ``start``, which must begin a line."""
+        for part, part_start, size in self.parts:
+            if part_start + size <= start:
+                continue
+            with _open_binary(part) as f:
+                f.seek(max(0, start - part_start))
+                yield from f
+
+    def line_start(self, line: int) -> Tuple[int, int]:
+        """``(byte offset, lines to skip from there)`` to reach 0-based ``line``."""
+        if not self.index:
+            return 0, line
+        offsets = self.index["offsets"]
+        slot = min(line // self.index["every"], len(offsets) - 1) if offsets else -1
+        if slot < 0:
+            return 0, line
+        return offsets[slot], line - slot * self.index["every"]
+
+    def lines(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[bytes]:
+        start, skip = self.line_start(offset)
+        sent = 0
+        for line in self.iter_lines(start):
+            if skip:
+                skip -= 1
+                continue
+            if limit is not None and sent >= limit:
+                return
+            sent += 1
+            yield line
+
+    def tail_start(self, n: int) -> int:
+        """Byte offset where the last ``n`` lines begin."""
+        if n <= 0:
+            return self.size
+        if self.index:
+            start, skip = self.line_start(max(0, self.index["lines"] - n))
+            if not skip:
+                return start
+            for line in self.iter_lines(start):
+                start += len(line)
+                skip -= 1
+                if not skip:
+                    return start
+        found = self._tail_from_live(n)
+        if found is not None:
+            return found
+        # Spans rotated segments: count forward, remembering the last n line starts
+        starts: deque = deque(maxlen=n)
+        position = 0
+        for line in self.iter_lines(0):
+            starts.append(position)
+            position += len(line)
+        return starts[0] if starts else 0
+
+    def _tail_from_live(self, n: int) -> Optional[int]:
+        if not self.parts or self.parts[-1][0].endswith(".gz"):
+            return None
+        part, part_start, size = self.parts[-1]
+        with open(part, "rb") as f:
+            position = size
+            newlines = 0
+            # A final line without a newline still counts as a line
+            if size:
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    newlines = -1
+            while position > 0:
+                step = min(_CHUNK, position)
+                position -= step
+                f.seek(position)
+                block = f.read(step)
+                at = len(block)
+                while True:
+                    at = block.rfind(b"\n", 0, at)
+                    if at < 0:
+                        break
+                    newlines += 1
+                    if newlines == n:
+                        return part_start + position + at + 1
+        return part_start if len(self.parts) == 1 else None
+
+
+def build_line_index(path: str, every: int = LOG_INDEX_EVERY) -> Optional[dict]:
+    """Write ``<path>.idx`` for a finished log; returns the index or None if there is no log."""
+    view = LogView(path)
+    if not view.exists:
+        return None
+    offsets, position, lines = [], 0, 0
+    for line in view.iter_lines(0):
+        if lines % every == 0:
+            offsets.append(position)
+        position += len(line)
+        lines += 1
+    index = {"every": every, "lines": lines, "offsets": offsets, "parts": view._signature()}
+    tmp = index_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, index_path(path))
+    return index
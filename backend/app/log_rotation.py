@@ -0,0 +1,161 @@
+"""
+Size/age rotation with gzip compression for platform and run logs.
+
+When a log reaches its policy's size or age limit, the live file is renamed
+away and compressed into ``<name>.<n>.gz``, where ``n`` increases with every
+rotation. Older segments therefore keep their names and readers can list them
+in order. Several processes may share a log (mock server workers). Each one
+claims the live file with an atomic rename and the next segment number with
+an exclusive create, so two processes never compress the same data or
+overwrite a segment.
+
+``log_parts`` lists a log's segments oldest first followed by the live file;
+``log_reader.LogView`` reads them back as one stream.
+
+Platform logs (``api_log.txt``, ``user_action_log.txt``,
+``mock_access_log.txt``) use ``LOG_ROTATE_*`` and keep ``LOG_ROTATE_KEEP``
+segments. Run logs (``log/<run_id>/run.log``) use ``RUN_LOG_ROTATE_*`` and
+keep every segment, since they are the run's record.
+"""
+import gzip
+import os
+import re
+import shutil
+import time
+from typing import List, Optional
+
+
+class RotationPolicy:
+    __slots__ = ("max_bytes", "max_age", "keep")
+
+    def __init__(self, max_bytes: int = 0, max_age: float = 0, keep: int = 0):
+        # 0 disables the limit; keep=0 keeps every rotated segment
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_age > 0
+
+    def due(self, size: int, started: float) -> bool:
+        if size <= 0:
+            return False
+        if self.max_bytes > 0 and size >= self.max_bytes:
+            return True
+        return self.max_age > 0 and time.time() - started >= self.max_age
+
+
+PLATFORM_LOG_ROTATION = RotationPolicy(
+    int(os.getenv("LOG_ROTATE_MAX_BYTES", str(50 * 1024 * 1024))),
+    float(os.getenv("LOG_ROTATE_MAX_AGE", "0")),
+    int(os.getenv("LOG_ROTATE_KEEP", "10")),
+)
+RUN_LOG_ROTATION = RotationPolicy(
+    int(os.getenv("RUN_LOG_ROTATE_MAX_BYTES", str(64 * 1024 * 1024))),
+    float(os.getenv("RUN_LOG_ROTATE_MAX_AGE", "0")),
+)
+
+
+def _segment_number(path: str, name: str) -> Optional[int]:
+    m = re.fullmatch(re.escape(os.path.basename(path)) + r"\.(\d+)\.gz", name)
+    return int(m.group(1)) if m else None
+
+
+def segments(path: str) -> List[str]:
+    """Rotated segments of ``path``, oldest first."""
+    directory = os.path.dirname(path) or "."
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    numbered = [(n, name) for name in names if (n := _segment_number(path, name)) is not None]
+    return [os.path.join(directory, name) for _, name in sorted(numbered)]
+
+
+def log_parts(path: str) -> List[str]:
+    """Rotated segments followed by the live file (when it exists)."""
+    parts = segments(path)
+    if os.path.exists(path):
+        parts.append(path)
+    return parts
+
+
+def segment_started(path: str) -> float:
+    """When the live file started: the last rotation, or now if it never rotated."""
+    parts = segments(path)
+    return os.path.getmtime(parts[-1]) if parts else time.time()
+
+
+def rotate(path: str, policy: RotationPolicy) -> Optional[str]:
+    """
+    Compress the live file into the next segment and prune old segments.
+
+    Returns the new segment's path, or None if another process rotated the
+    file first.
+    """
+    claimed = f"{path}.rotating.{os.getpid()}.{time.monotonic_ns()}"
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    existing = segments(path)
+    number = _segment_number(path, os.path.basename(existing[-1])) + 1 if existing else 1
+    while True:
+        target = f"{path}.{number}.gz"
+        try:
+            out = open(target, "xb")
+            break
+        except FileExistsError:
+            number += 1
+    with out, open(claimed, "rb") as src, gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+        shutil.copyfileobj(src, gz, 1024 * 1024)
+    os.remove(claimed)
+    if policy.keep > 0:
+        for old in segments(path)[:-policy.keep]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    return target
+
+
+class RotatingFile:
+    """
+    Append-only text file that rotates itself according to ``policy``.
+
+    Used by the test-run workers in place of ``open(run.log, "a")``.
+    """
+
+    def __init__(self, path: str, policy: RotationPolicy = RUN_LOG_ROTATION, encoding: str = "utf-8"):
+        self.path = path
+        self.policy = policy
+        self.encoding = encoding
+        self.started = segment_started(path)
+        self._open()
+
+    def _open(self) -> None:
+        self._file = open(self.path, "a", encoding=self.encoding)
+        self.size = self._file.tell()
+
+    def write(self, text: str) -> int:
+        if self.policy.enabled and self.policy.due(self.size, self.started):
+            self._file.close()
+            rotate(self.path, self.policy)
+            self.started = time.time()
+            self._open()
+        written = self._file.write(text)
+        self.size += len(text.encode(self.encoding)) if not text.isascii() else len(text)
+        return written
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "RotatingFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,152 @@
+"""
+Queue-backed log files.
+
+Request handlers call ``LogSink.write`` which only appends the line to an
+in-memory buffer. A background task per sink writes the buffer to disk in one
+append (in a worker thread, so file I/O never blocks the event loop) once
+``LOG_BATCH_SIZE`` lines are waiting or every ``LOG_FLUSH_INTERVAL`` seconds.
+The buffer is bounded by ``LOG_QUEUE_SIZE``; lines arriving while it is full
+are dropped and counted instead of slowing requests down. ``stop`` writes
+whatever is still buffered. Files are rotated and gzipped by the writer
+according to ``log_rotation.PLATFORM_LOG_ROTATION``.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from .log_rotation import PLATFORM_LOG_ROTATION, RotationPolicy, rotate, segment_started
+from .metrics import registry, counter, gauge
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))
+
+# Every sink created in this process, for /metrics.
+_sinks: List["LogSink"] = []
+
+
+class LogSink:
+    def __init__(
+        self,
+        path: str,
+        max_queue: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+        rotation: RotationPolicy = PLATFORM_LOG_ROTATION,
+    ):
+        self.path = path
+        self.rotation = rotation
+        self._segment_started: Optional[float] = None
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.rotations = 0
+        _sinks.append(self)
+
+    def write(self, line: str) -> bool:
+        """Queue one line (a newline is added if missing); False if it was dropped."""
+        if len(self._buffer) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self._buffer.append(line if line.endswith("\n") else line + "\n")
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+        return True
+
+    def write_many(self, lines: List[str]) -> int:
+        """Queue several lines; returns how many were accepted."""
+        return sum(1 for line in lines if self.write(line))
+
+    def _rotate_if_due(self) -> None:
+        if self._segment_started is None:
+            self._segment_started = segment_started(self.path)
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if self.rotation.due(size, self._segment_started):
+            if rotate(self.path, self.rotation) is not None:
+                self.rotations += 1
+            self._segment_started = time.time()
+
+    def _append(self, lines: List[str]) -> None:
+        if self.rotation.enabled:
+            self._rotate_if_due()
+        with open(self.path, "a", encoding="utf-8", errors="replace") as f:
+            f.write("".join(lines))
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of lines written."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            batch, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._append, batch)
+            except OSError as e:
+                self.errors += 1
+                self.dropped += len(batch)
+                print(f"[log-sink] writing {self.path} failed: {e}")
+                return 0
+            self.written += len(batch)
+            self.batches += 1
+            return len(batch)
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._lock = self._lock or asyncio.Lock()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the writer task and flush the remaining lines."""
+        if self._task is not None:
+            # Let an in-flight write finish rather than cancelling it mid-append.
+            self._closing = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        self._wake = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "rotations": self.rotations,
+        }
+
+
+@registry.collector
+def _sink_families():
+    labels = [({"file": os.path.basename(sink.path)}, sink) for sink in _sinks]
+    yield counter("log_lines_written_total", "Log lines appended to disk.", [(l, s.written) for l, s in labels])
+    yield counter("log_lines_dropped_total", "Log lines dropped because the queue was full or a write failed.", [(l, s.dropped) for l, s in labels])
+    yield gauge("log_queue_pending", "Log lines waiting to be written.", [(l, len(s._buffer)) for l, s in labels])
@@ -8,28 +8,46 @@ try:
 except Exception:
     UploadFile = None  # type: ignore
     File = None  # type: ignore
-from fastapi.responses import Response
+
+# Excel export is optional; it requires openpyxl.
+try:
+    from openpyxl import Workbook  # type: ignore
+except Exception:
+    Workbook = None  # type: ignore
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import Optional, List
-import subprocess, threading, asyncio, time, os, shutil, json
+import subprocess, threading, asyncio, time, os, shutil, json, csv, io, tempfile, zlib, sqlite3
 
 from .storage import (
     # Projects
-    list_projects, get_project, create_project, update_project, delete_project, Project,
+    list_projects, get_project, create_project, update_project, Project,
+    mark_project_deleting, is_project_deleting, list_deleting_projects, list_project_screenshots, purge_project_rows,
     # Global bugs and runs (legacy)
     list_bugs, get_bug, create_bug, update_bug, delete_bug, Bug,
     list_runs, create_run, update_run, delete_run,
     # Project‑scoped cases and bugs
-    list_cases, get_case, create_case, update_case, delete_case,
+    list_cases, count_cases, get_case, create_case, update_case, delete_case, bulk_write_cases, iter_cases,
     get_app_device, set_app_device,
     list_project_bugs, get_project_bug, create_project_bug, update_project_bug, delete_project_bug,
     # Paths for case types
     WEB_CASES_PATH, APP_CASES_PATH, API_CASES_PATH, APP_DEVICE_PATH,
-    get_all_mocks, save_mock
+    get_all_mocks, save_mock, list_mock_journal
 )
-from .database import init_db
+from .database import init_db, open_pool, close_pool, SCHEMA
+from .cache import query_cache
+from .mock_router import validate_mock
+from .mock_server import serve_mock, reload_mock_index, start_journal_writer, stop_journal_writer, configure_faults, DropConnections
+from .mock_journal import mock_journal
+from .mock_proxy import mock_proxy
+from .mock_faults import fault_injector
+from .log_sink import LogSink
+from .log_rotation import RotatingFile
+from .log_reader import LogView, build_line_index
+from .mock_files import parse_range, RangeNotSatisfiable
+from .metrics import registry, http_request_duration, route_template, counter, gauge, CONTENT_TYPE
 
 
 # ---- Data directories (default to project-root /data) ----
@@ -60,10 +78,35 @@ def _favicon():
     return Response(status_code=204)
 
 # ---- App startup event ----
+_journal_task: Optional[asyncio.Task] = None
+
 @app.on_event("startup")
 async def on_startup():
-    """Initialize the database when the application starts."""
+    """Initialize the database and open the shared connection pool."""
+    global _journal_task
     await init_db()
+    await open_pool()
+    for pid in await list_deleting_projects():
+        _start_project_purge(pid)
+    await reload_mock_index()
+    _journal_task = start_journal_writer()
+    await mock_proxy.start(on_saved=reload_mock_index)
+    api_log.start()
+    user_action_log.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Flush recorded mocks, the mock journal and log files, then close pooled database connections."""
+    await mock_proxy.stop()
+    await stop_journal_writer(_journal_task)
+    await api_log.stop()
+    await user_action_log.stop()
+    await close_pool()
+
+@app.exception_handler(sqlite3.IntegrityError)
+async def _integrity_error(request, exc: sqlite3.IntegrityError):
+    """Constraint violations (e.g. a case for a missing project) are client errors."""
+    return JSONResponse(status_code=409, content={"detail": f"Constraint violation: {exc}"})
 
 app.add_middleware(
     CORSMiddleware,
@@ -79,49 +122,148 @@ from datetime import datetime
 API_LOG_FILE = os.path.join(DATA_DIR, "api_log.txt")
 USER_ACTION_LOG_FILE = os.path.join(DATA_DIR, "user_action_log.txt")
 
+api_log = LogSink(API_LOG_FILE)
+user_action_log = LogSink(USER_ACTION_LOG_FILE)
+
 @app.middleware("http")
 async def log_api_requests(request: Request, call_next):
-    """Middleware to log every API request and its response."""
+    """Middleware to log every API request, its response status and latency."""
+    started = time.perf_counter()
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_line = f"{timestamp} - {request.client.host} - \"{request.method} {request.url.path}\""
+    client = request.client.host if request.client else "-"
 
     response = await call_next(request)
 
-    log_line += f" - {response.status_code}\n"
-
-    with open(API_LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(log_line)
+    elapsed = time.perf_counter() - started
+    http_request_duration.observe((request.method, route_template(request.scope), response.status_code), elapsed)
+    elapsed_ms = elapsed * 1000
+    api_log.write(f"{timestamp} - {client} - \"{request.method} {request.url.path}\" - {response.status_code} - {elapsed_ms:.1f}ms")
 
     return response
 
+# Outermost, so drop faults on the catch-all mock route can reach the connection.
+app.add_middleware(DropConnections)
+
+# Most actions accepted by one /log-actions call.
+USER_ACTION_BATCH_MAX = int(os.getenv("USER_ACTION_BATCH_MAX", "1000"))
+
 class UserAction(BaseModel):
     action: str
+    # When the action happened (Unix seconds); batched actions arrive late
+    ts: Optional[float] = None
+
+def _user_action_line(user_action: UserAction) -> str:
+    try:
+        when = datetime.fromtimestamp(user_action.ts) if user_action.ts else datetime.now()
+    except (OverflowError, OSError, ValueError):
+        when = datetime.now()
+    return f"{when.strftime('%Y-%m-%d %H:%M:%S')} - [USER ACTION] {user_action.action}"
 
 @app.post("/log-action")
 async def log_user_action(user_action: UserAction):
     """Endpoint to log a user action from the frontend."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_line = f"{timestamp} - [USER ACTION] {user_action.action}\n"
-
-    with open(USER_ACTION_LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(log_line)
+    user_action_log.write(_user_action_line(user_action))
 
     return {"ok": True}
 
+@app.post("/log-actions")
+async def log_user_actions(user_actions: List[UserAction]):
+    """Log a batch of user actions buffered by the frontend, in order."""
+    if len(user_actions) > USER_ACTION_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {USER_ACTION_BATCH_MAX} actions per request")
+    accepted = user_action_log.write_many([_user_action_line(a) for a in user_actions])
+    return {"ok": True, "accepted": accepted, "dropped": len(user_actions) - accepted}
+
 @app.get("/logs/{run_id}")
-async def get_log_file(run_id: str):
-    """Retrieve the contents of a specific run's log file."""
+def get_log_file(
+    request: Request,
+    run_id: str,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    tail: Optional[int] = None,
+):
+    """
+    Stream a run's log, including rotated ``run.log.<n>.gz`` segments.
+
+    - ``offset``/``limit``: lines starting at 0-based line ``offset``.
+    - ``tail=N``: the last N lines.
+    - ``Range: bytes=a-b`` (without line parameters): a byte range of the
+      whole log, answered with 206.
+
+    Finished runs have a sparse line index, so a line offset is a seek rather
+    than a scan. Responses are gzip-encoded when the client accepts it, except
+    for byte ranges.
+    """
     # Sanitize run_id to prevent directory traversal
     if not run_id.isalnum() and "_" not in run_id and "-" not in run_id:
         raise HTTPException(status_code=400, detail="Invalid run_id format")
+    if any(v is not None and v < 0 for v in (offset, limit, tail)):
+        raise HTTPException(status_code=400, detail="offset, limit and tail must be non-negative")
 
-    log_file_path = os.path.join(LOG_DIR_BASE, run_id, "run.log")
-
-    if not os.path.exists(log_file_path):
+    view = LogView(os.path.join(LOG_DIR_BASE, run_id, "run.log"))
+    if not view.exists:
         raise HTTPException(status_code=404, detail="Log file not found")
 
-    with open(log_file_path, "r", encoding="utf-8") as f:
-        return Response(content=f.read(), media_type="text/plain")
+    headers = {"Accept-Ranges": "bytes"}
+    if view.total_lines is not None:
+        headers["X-Log-Lines"] = str(view.total_lines)
+    status = 200
+    length: Optional[int] = view.size
+    range_header = request.headers.get("range")
+    if tail is not None:
+        body = _coalesce(view.iter_lines(view.tail_start(tail)))
+        length = None
+    elif offset is not None or limit is not None:
+        body = _coalesce(view.lines(offset or 0, limit))
+        length = None
+    elif range_header:
+        try:
+            byte_range = parse_range(range_header, view.size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{view.size}"})
+        body = view.iter_bytes(*(byte_range or (0, None)))
+        if byte_range is not None:
+            status = 206
+            length = byte_range[1] - byte_range[0] + 1
+            headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{view.size}"
+    else:
+        body = view.iter_bytes()
+
+    if status == 200 and "gzip" in request.headers.get("accept-encoding", ""):
+        body = _gzip_iter(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    elif length is not None:
+        headers["Content-Length"] = str(length)
+    return StreamingResponse(body, status_code=status, media_type="text/plain; charset=utf-8", headers=headers)
+
+def _coalesce(lines, size: int = 65536):
+    """Join small pieces into ~64 KiB chunks; each chunk of a sync iterator costs a threadpool hop."""
+    pending, pending_size = [], 0
+    for line in lines:
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= size:
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+    if pending:
+        yield b"".join(pending)
+
+def _gzip_iter(chunks):
+    """Synchronous counterpart of ``_gzip_stream`` for file-backed bodies."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _index_run_log(log_dir: str) -> None:
+    """Build the sparse line index of a finished run's log."""
+    try:
+        build_line_index(os.path.join(log_dir, "run.log"))
+    except Exception as e:
+        print(f"[logs] indexing {log_dir} failed: {e}")
 
 # ---------- Pydantic models ----------
 class ProjectIn(BaseModel):
@@ -205,14 +347,41 @@ class ProjectBugIn(BaseModel):
     note: str = ""
     screenshot: str = ""
 
+# ---------- Conditional GETs ----------
+# List responses carry a weak ETag derived from the data version counters that
+# storage bumps on every write. The epoch changes per process, so tags issued
+# before a restart (or by another worker) never match by accident.
+_ETAG_EPOCH = f"{os.getpid():x}{int(time.time()):x}"
+
+def _check_etag(request: Request, response: Response, table: str, project_id: Optional[int] = None) -> Optional[Response]:
+    """
+    Set the ETag for a list response, or return a 304 response when the client's
+    If-None-Match already names the current version of this query.
+    """
+    query = zlib.crc32(request.url.query.encode("utf-8"))
+    etag = f'W/"{_ETAG_EPOCH}-{query_cache.version(table, project_id)}-{query:x}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
 # ---------- Health ----------
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+def api_cache_stats():
+    """Hit/miss counters and size of the query result cache."""
+    return query_cache.stats()
+
 # ---------- Projects CRUD ----------
 @app.get("/projects")
-async def api_list_projects(q: Optional[str] = None, owner: Optional[str] = None, status: Optional[str] = None):
+async def api_list_projects(request: Request, response: Response, q: Optional[str] = None, owner: Optional[str] = None, status: Optional[str] = None):
+    not_modified = _check_etag(request, response, "projects")
+    if not_modified:
+        return not_modified
     return await list_projects(keyword=q, owner=owner, status=status)
 
 @app.get("/projects/{pid}")
@@ -233,10 +402,116 @@ async def api_update_project(pid: int, payload: ProjectIn):
         raise HTTPException(status_code=404, detail="Project not found")
     return p
 
+# ---------- Project purge ----------
+# Deleting a project hides it immediately and removes its rows and run artifacts
+# in a background task. Progress is kept per project id until the next restart.
+project_purges: dict[int, dict] = {}
+_purge_tasks: dict[int, asyncio.Task] = {}
+
+def _run_project_id(name: str) -> Optional[int]:
+    """
+    Project a run belongs to, from its ``meta.json``. Runs started before
+    meta.json was written fall back to the scoped cases file the run was
+    started with (``tmp_<kind>_cases_<run>.json``, keyed by project id).
+    """
+    try:
+        with open(os.path.join(LOG_DIR_BASE, name, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("project_id")
+    except (OSError, ValueError, AttributeError):
+        pass
+    for kind in ("web", "api", "app"):
+        try:
+            with open(os.path.join(DATA_DIR, f"tmp_{kind}_cases_{name}.json"), "r", encoding="utf-8") as f:
+                scoped = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(scoped, dict) and len(scoped) == 1:
+            key = next(iter(scoped))
+            if key.isdigit():
+                return int(key)
+    return None
+
+def _remove_project_artifacts(project_id: int, screenshots: list) -> int:
+    """Delete the project's run directories and its bug screenshots. Returns runs removed."""
+    run_dirs = (LOG_DIR_BASE, os.path.join(DATA_DIR, "allure-results"), os.path.join(DATA_DIR, "allure-report"))
+    names = set()
+    for base in run_dirs:
+        try:
+            names.update(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+        except OSError:
+            continue
+    removed = 0
+    for name in sorted(names):
+        if _run_project_id(name) != project_id:
+            continue
+        for base in run_dirs:
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+        for kind in ("web", "api", "app"):
+            try:
+                os.remove(os.path.join(DATA_DIR, f"tmp_{kind}_cases_{name}.json"))
+            except OSError:
+                pass
+        removed += 1
+    uploads_dir = os.path.join(DATA_DIR, "uploads")
+    for path in screenshots:
+        if path.startswith("/uploads/"):
+            try:
+                os.remove(os.path.join(uploads_dir, os.path.basename(path)))
+            except OSError:
+                pass
+    return removed
+
+async def _purge_project(pid: int) -> None:
+    job = project_purges[pid]
+    try:
+        screenshots = await list_project_screenshots(pid)
+        async for table, deleted in purge_project_rows(pid):
+            job["rows"][table] = job["rows"].get(table, 0) + deleted
+            job["deleted_rows"] += deleted
+        job["status"] = "removing_artifacts"
+        job["removed_runs"] = await asyncio.to_thread(_remove_project_artifacts, pid, screenshots)
+        job["status"] = "done"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        _purge_tasks.pop(pid, None)
+
+def _start_project_purge(pid: int) -> dict:
+    if pid in _purge_tasks:
+        return project_purges[pid]
+    project_purges[pid] = {
+        "project_id": pid,
+        "status": "running",
+        "deleted_rows": 0,
+        "rows": {},
+        "removed_runs": 0,
+        "started_at": time.time(),
+        "finished_at": None,
+    }
+    _purge_tasks[pid] = asyncio.create_task(_purge_project(pid))
+    return project_purges[pid]
+
 @app.delete("/projects/{pid}")
 async def api_delete_project(pid: int):
-    await delete_project(pid)
-    return {"ok": True}
+    """Hide the project at once and purge its rows and artifacts in the background."""
+    if not await mark_project_deleting(pid):
+        return {"ok": True, "purge": project_purges.get(pid)}
+    return {"ok": True, "purge": _start_project_purge(pid)}
+
+@app.get("/projects/{pid}/purge")
+async def api_project_purge_status(pid: int):
+    """Progress of a project's background purge."""
+    job = project_purges.get(pid)
+    if not job:
+        raise HTTPException(status_code=404, detail="No purge for this project")
+    return job
+
+async def _check_project_writable(pid: int) -> None:
+    """Reject writes to a project that is being purged."""
+    if await is_project_deleting(pid):
+        raise HTTPException(status_code=409, detail="Project is being deleted")
 
 # ---------- Bugs CRUD ----------
 @app.get("/bugs")
@@ -322,15 +597,42 @@ else:
     async def api_upload_file_unavailable():
         raise HTTPException(status_code=500, detail="python-multipart is required for file uploads")
 
+# ---------- Project‑scoped case pagination ----------
+async def _paged_cases(table_name: str, pid: int, q: Optional[str], filters: dict, page: int, page_size: int, cursor: Optional[int]) -> dict:
+    """
+    Fetch one page of cases and the total match count with two SQL queries.
+
+    ``cursor`` is the last id of the previous page; when given it takes
+    precedence over ``page``. ``next_cursor`` is returned for the following page.
+    Keyword searches are ranked by relevance, so they page by ``page`` only
+    unless a cursor is passed explicitly.
+    """
+    if page < 1:
+        page = 1
+    if page_size < 1:
+        page_size = 50
+    total = await count_cases(table_name, pid, q, filters)
+    items = await list_cases(
+        table_name, pid, q, filters,
+        limit=page_size, offset=(page - 1) * page_size, after_id=cursor,
+    )
+    next_cursor = None
+    if len(items) == page_size and (not q or cursor is not None):
+        next_cursor = items[-1]["id"]
+    return {"total": total, "items": items, "next_cursor": next_cursor}
+
 # ---------- Project‑scoped Web Cases ----------
 @app.get("/projects/{pid}/webcases")
 async def api_list_web_cases(
     pid: int,
+    request: Request,
+    response: Response,
     q: Optional[str] = None,
     action: Optional[str] = None,
     result: Optional[str] = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[int] = None,
 ):
     """List web test cases for a project with optional keyword and filters. Supports pagination."""
     filters: dict[str, set[str]] = {}
@@ -338,31 +640,30 @@ async def api_list_web_cases(
         filters["action"] = set([x for x in action.split(",") if x])
     if result:
         filters["result"] = set([x for x in result.split(",") if x])
-    cases = await list_cases(WEB_CASES_PATH, pid, q, filters)
-    total = len(cases)
-    # pagination
-    if page < 1:
-        page = 1
-    if page_size < 1:
-        page_size = 50
-    start = (page - 1) * page_size
-    end = start + page_size
-    return {"total": total, "items": cases[start:end]}
+    not_modified = _check_etag(request, response, WEB_CASES_PATH, pid)
+    if not_modified:
+        return not_modified
+    return await _paged_cases(WEB_CASES_PATH, pid, q, filters, page, page_size, cursor)
 
 @app.get("/projects/{pid}/webcases/names")
-async def api_list_web_case_names(pid: int):
+async def api_list_web_case_names(pid: int, request: Request, response: Response):
     """Return a lightweight list of web cases (id and name) for a project."""
+    not_modified = _check_etag(request, response, WEB_CASES_PATH, pid)
+    if not_modified:
+        return not_modified
     cases = await list_cases(WEB_CASES_PATH, pid, None, None)
     # The name is in 'feature' or 'test_feature'
     return [{"id": c.get("id"), "name": c.get("feature") or c.get("test_feature") or ""} for c in cases]
 
 @app.post("/projects/{pid}/webcases")
 async def api_create_web_case(pid: int, payload: WebCaseIn):
+    await _check_project_writable(pid)
     case = await create_case(WEB_CASES_PATH, pid, payload.dict(), id_field="id")
     return case
 
 @app.put("/projects/{pid}/webcases/{case_id}")
 async def api_update_web_case(pid: int, case_id: int, payload: WebCaseIn):
+    await _check_project_writable(pid)
     # State locking: prevent changes if status is '已審核'
     current_case = await get_case(WEB_CASES_PATH, pid, case_id, id_field="id")
     if not current_case:
@@ -380,6 +681,7 @@ async def api_update_web_case(pid: int, case_id: int, payload: WebCaseIn):
 
 @app.delete("/projects/{pid}/webcases/{case_id}")
 async def api_delete_web_case(pid: int, case_id: int):
+    await _check_project_writable(pid)
     ok = await delete_case(WEB_CASES_PATH, pid, case_id, id_field="id")
     return {"ok": ok}
 
@@ -387,36 +689,43 @@ async def api_delete_web_case(pid: int, case_id: int):
 @app.get("/projects/{pid}/appcases")
 async def api_list_app_cases(
     pid: int,
+    request: Request,
+    response: Response,
     q: Optional[str] = None,
     action: Optional[str] = None,
     result: Optional[str] = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[int] = None,
 ):
     filters: dict[str, set[str]] = {}
     if action:
         filters["action"] = set([x for x in action.split(",") if x])
     if result:
         filters["result"] = set([x for x in result.split(",") if x])
-    cases = await list_cases(APP_CASES_PATH, pid, q, filters)
-    total = len(cases)
-    start = max((page - 1), 0) * page_size
-    end = start + page_size
-    return {"total": total, "items": cases[start:end]}
+    not_modified = _check_etag(request, response, APP_CASES_PATH, pid)
+    if not_modified:
+        return not_modified
+    return await _paged_cases(APP_CASES_PATH, pid, q, filters, page, page_size, cursor)
 
 @app.get("/projects/{pid}/appcases/names")
-async def api_list_app_case_names(pid: int):
+async def api_list_app_case_names(pid: int, request: Request, response: Response):
     """Return a lightweight list of app cases (id and name) for a project."""
+    not_modified = _check_etag(request, response, APP_CASES_PATH, pid)
+    if not_modified:
+        return not_modified
     cases = await list_cases(APP_CASES_PATH, pid, None, None)
     return [{"id": c.get("id"), "name": c.get("feature") or c.get("test_feature") or ""} for c in cases]
 
 @app.post("/projects/{pid}/appcases")
 async def api_create_app_case(pid: int, payload: AppCaseIn):
+    await _check_project_writable(pid)
     case = await create_case(APP_CASES_PATH, pid, payload.dict(), id_field="id")
     return case
 
 @app.put("/projects/{pid}/appcases/{case_id}")
 async def api_update_app_case(pid: int, case_id: int, payload: AppCaseIn):
+    await _check_project_writable(pid)
     # State locking: prevent changes if status is '已審核'
     current_case = await get_case(APP_CASES_PATH, pid, case_id, id_field="id")
     if not current_case:
@@ -433,6 +742,7 @@ async def api_update_app_case(pid: int, case_id: int, payload: AppCaseIn):
 
 @app.delete("/projects/{pid}/appcases/{case_id}")
 async def api_delete_app_case(pid: int, case_id: int):
+    await _check_project_writable(pid)
     ok = await delete_case(APP_CASES_PATH, pid, case_id, id_field="id")
     return {"ok": ok}
 
@@ -440,37 +750,44 @@ async def api_delete_app_case(pid: int, case_id: int):
 @app.get("/projects/{pid}/apicases")
 async def api_list_api_cases(
     pid: int,
+    request: Request,
+    response: Response,
     q: Optional[str] = None,
     method: Optional[str] = None,
     result: Optional[str] = None,
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[int] = None,
 ):
     filters: dict[str, set[str]] = {}
     if method:
         filters["method"] = set([x for x in method.split(",") if x])
     if result:
         filters["result"] = set([x for x in result.split(",") if x])
-    cases = await list_cases(API_CASES_PATH, pid, q, filters)
-    total = len(cases)
-    start = max((page - 1), 0) * page_size
-    end = start + page_size
-    return {"total": total, "items": cases[start:end]}
+    not_modified = _check_etag(request, response, API_CASES_PATH, pid)
+    if not_modified:
+        return not_modified
+    return await _paged_cases(API_CASES_PATH, pid, q, filters, page, page_size, cursor)
 
 @app.get("/projects/{pid}/apicases/names")
-async def api_list_api_case_names(pid: int):
+async def api_list_api_case_names(pid: int, request: Request, response: Response):
     """Return a lightweight list of api cases (id and name) for a project."""
+    not_modified = _check_etag(request, response, API_CASES_PATH, pid)
+    if not_modified:
+        return not_modified
     cases = await list_cases(API_CASES_PATH, pid, None, None)
     # API cases use 'step' as their ID field
     return [{"id": c.get("step"), "name": c.get("feature") or c.get("test_feature") or ""} for c in cases]
 
 @app.post("/projects/{pid}/apicases")
 async def api_create_api_case(pid: int, payload: ApiCaseIn):
+    await _check_project_writable(pid)
     case = await create_case(API_CASES_PATH, pid, payload.dict(), id_field="id") # Using 'id' now
     return case
 
 @app.put("/projects/{pid}/apicases/{case_id}")
 async def api_update_api_case(pid: int, case_id: int, payload: ApiCaseIn):
+    await _check_project_writable(pid)
     # State locking: prevent changes if status is '已審核'
     current_case = await get_case(API_CASES_PATH, pid, case_id, id_field="id")
     if not current_case:
@@ -487,9 +804,193 @@ async def api_update_api_case(pid: int, case_id: int, payload: ApiCaseIn):
 
 @app.delete("/projects/{pid}/apicases/{case_id}")
 async def api_delete_api_case(pid: int, case_id: int):
+    await _check_project_writable(pid)
     ok = await delete_case(API_CASES_PATH, pid, case_id, id_field="id")
     return {"ok": ok}
 
+# ---------- Project‑scoped bulk import ----------
+# Route segment -> (table, input model) for endpoints shared by all case kinds.
+CASE_KINDS = {
+    "webcases": (WEB_CASES_PATH, WebCaseIn),
+    "appcases": (APP_CASES_PATH, AppCaseIn),
+    "apicases": (API_CASES_PATH, ApiCaseIn),
+}
+
+# Request bodies up to this size stay in memory; larger uploads spill to disk.
+BULK_SPOOL_BYTES = 8 * 1024 * 1024
+
+async def _spool_request(request: Request) -> tempfile.SpooledTemporaryFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+def _iter_bulk_rows(spool, content_type: str):
+    """Yield raw row objects from a JSON array, NDJSON or CSV upload."""
+    text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+    if "csv" in content_type:
+        for row in csv.DictReader(text):
+            # DictReader puts surplus cells under a None key and fills missing ones with None
+            if None in row:
+                yield ValueError(f"Row has {len(row[None])} more cell(s) than the header")
+            elif any(value is None for value in row.values()):
+                yield ValueError("Row has fewer cells than the header")
+            else:
+                yield row
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield e
+    else:
+        data = json.load(text)
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of cases")
+        yield from data
+
+def _validated_rows(raw_rows, model, errors: list):
+    """
+    Validate rows with the case model; invalid rows are reported in ``errors`` and skipped.
+    Only fields present in the row are yielded, so upserts leave other columns alone.
+    """
+    for row_no, raw in enumerate(raw_rows, start=1):
+        if isinstance(raw, Exception):
+            errors.append({"row": row_no, "errors": [{"field": "", "msg": str(raw)}]})
+            continue
+        if not isinstance(raw, dict) or not all(isinstance(k, str) for k in raw):
+            errors.append({"row": row_no, "errors": [{"field": "", "msg": "Row must be an object with string keys"}]})
+            continue
+        try:
+            yield model(**raw).dict(exclude_unset=True)
+        except ValidationError as e:
+            errors.append({
+                "row": row_no,
+                "errors": [{"field": ".".join(str(x) for x in err["loc"]), "msg": err["msg"]} for err in e.errors()],
+            })
+
+def _parse_bulk_upload(spool, content_type: str, model, errors: list) -> list:
+    """Parse and validate a whole upload (blocking; run in a worker thread)."""
+    return list(_validated_rows(_iter_bulk_rows(spool, content_type), model, errors))
+
+@app.post("/projects/{pid}/{kind}/bulk")
+async def api_bulk_import_cases(pid: int, kind: str, request: Request, upsert: bool = False):
+    """
+    Import many cases at once from a JSON array, NDJSON (``application/x-ndjson``)
+    or CSV (``text/csv``) body.
+
+    The whole upload is parsed and validated with the same models as the
+    single-row endpoints in a worker thread first; only then are the valid
+    rows written with ``executemany`` in one transaction, so an import is all
+    or nothing and the write lock is held just for the inserts. Invalid rows
+    are skipped and reported by 1-based row number; a body that cannot be
+    parsed is rejected with 400 before anything is written. With
+    ``upsert=true`` rows matching an existing case by test_feature/test_step
+    (API cases: test_feature/method/api_path) update it instead of creating a
+    duplicate.
+    """
+    if kind not in CASE_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown case type: {kind}")
+    table_name, model = CASE_KINDS[kind]
+    await _check_project_writable(pid)
+    content_type = request.headers.get("content-type", "application/json").lower()
+    spool = await _spool_request(request)
+    errors: list = []
+    try:
+        rows = await asyncio.to_thread(_parse_bulk_upload, spool, content_type, model, errors)
+    except (json.JSONDecodeError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse upload: {e}")
+    finally:
+        spool.close()
+    if rows and not await get_project(pid):
+        raise HTTPException(status_code=404, detail="Project not found")
+    try:
+        result = await bulk_write_cases(table_name, pid, rows, upsert=upsert, defaults=model().dict())
+    except sqlite3.IntegrityError as e:
+        # Nothing was written; keep the per-row report alongside the conflict
+        return JSONResponse(status_code=409, content={"detail": f"Constraint violation: {e}", "errors": errors})
+    result["errors"] = errors
+    return result
+
+# ---------- Project‑scoped export ----------
+EXPORT_TABLES = {kind: table for kind, (table, _) in CASE_KINDS.items()}
+EXPORT_TABLES["bugs"] = "bugs"
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+async def _export_ndjson(batches, columns):
+    async for rows in batches:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+async def _export_csv(batches, columns):
+    buf = io.StringIO()
+    # BOM so that Excel opens the UTF-8 file with the right encoding
+    buf.write("\ufeff")
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    async for rows in batches:
+        writer.writerows([row.get(k) for k in columns] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+async def _export_xlsx(batches, columns):
+    """Build the workbook in write-only mode in a temp file, then stream the file."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(list(columns))
+    async for rows in batches:
+        for row in rows:
+            ws.append([row.get(k) for k in columns])
+    with tempfile.TemporaryFile() as tmp:
+        await asyncio.to_thread(wb.save, tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(64 * 1024):
+            yield chunk
+
+async def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.get("/projects/{pid}/{kind}/export")
+async def api_export_cases(pid: int, kind: str, request: Request, format: str = "ndjson"):
+    """
+    Stream all web/app/api cases or bugs of a project as NDJSON, CSV or XLSX.
+
+    Rows are read in fixed-size batches and written as they arrive, so memory use
+    does not grow with the project. NDJSON and CSV are gzip-compressed when the
+    client accepts it. XLSX requires openpyxl.
+    """
+    if kind not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown export type: {kind}")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be one of: ndjson, csv, xlsx")
+    if format == "xlsx" and Workbook is None:
+        raise HTTPException(status_code=501, detail="openpyxl is required for XLSX export")
+
+    table_name = EXPORT_TABLES[kind]
+    columns = SCHEMA[table_name].columns
+    batches = iter_cases(table_name, pid)
+    body = {"ndjson": _export_ndjson, "csv": _export_csv, "xlsx": _export_xlsx}[format](batches, columns)
+    headers = {"Content-Disposition": f'attachment; filename="project{pid}_{kind}.{format}"'}
+    if format != "xlsx" and "gzip" in request.headers.get("accept-encoding", ""):
+        body = _gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
+
 # ---------- Project‑scoped APP Device Info ----------
 @app.get("/projects/{pid}/app-device")
 async def api_get_app_device(pid: int):
@@ -498,6 +999,7 @@ async def api_get_app_device(pid: int):
 
 @app.post("/projects/{pid}/app-device")
 async def api_set_app_device(pid: int, device: str):
+    await _check_project_writable(pid)
     await set_app_device(pid, device)
     return {"ok": True}
 
@@ -509,38 +1011,128 @@ class MockRequest(BaseModel):
     params: Optional[List[dict]] = None
     headers: Optional[List[dict]] = None
     body: Optional[str] = None
+    # Partial JSON body match instead of an exact body, e.g.
+    # {"subset": {"type": "order"}} or {"jsonpath": ["$.user.id == 42"]}
+    body_match: Optional[dict] = None
 
     # Response Definition
     response_status: int = 200
     response_headers: Optional[List[dict]] = None
     response_body: Optional[str] = ""
     delay_ms: int = 0
+    # Sampled delay replacing delay_ms, e.g. {"type": "lognormal", "median": 80, "sigma": 0.6}
+    latency_profile: Optional[dict] = None
+    # Stream the body at this many KiB/s
+    bandwidth_kbps: Optional[int] = None
+    # Fault injection rules, e.g. [{"type": "error", "rate": 0.1, "status": 503}]
+    faults: Optional[List[dict]] = None
+    # File under DATA_DIR streamed instead of response_body (supports Range)
+    body_file: Optional[str] = None
+    # Serve response_body and header values verbatim, without template placeholders
+    static_response: bool = False
 
 @app.get("/api/mocks")
 async def api_get_mocks():
     """Returns the list of all configured mocks."""
     return await get_all_mocks()
 
+@app.get("/api/mocks/journal")
+async def api_mock_journal(
+    method: Optional[str] = None,
+    path: Optional[str] = None,
+    mock_id: Optional[int] = None,
+    matched: Optional[bool] = None,
+    status: Optional[int] = None,
+    since: Optional[float] = None,
+    limit: int = 100,
+    source: str = "memory",
+):
+    """
+    Requests recently answered by the mock catch-all route, newest first.
+
+    ``source=memory`` reads this process's ring buffer; ``source=db`` reads the
+    persisted journal written by every mock server with MOCK_JOURNAL_PERSIST=1.
+    ``path`` matches as a substring and ``since`` is a Unix timestamp.
+    """
+    limit = max(1, min(limit, 1000))
+    if source == "db":
+        items = await list_mock_journal(method, path, mock_id, matched, status, since, limit)
+    elif source == "memory":
+        items = mock_journal.query(method, path, mock_id, matched, status, since, limit)
+    else:
+        raise HTTPException(status_code=400, detail="source must be 'memory' or 'db'")
+    return {"stats": mock_journal.stats(), "items": items}
+
+@app.get("/api/mocks/proxy")
+async def api_mock_proxy_status():
+    """Record/replay proxy settings and counters for this process."""
+    return mock_proxy.stats()
+
+@app.put("/api/mocks/proxy")
+async def api_mock_proxy_configure(upstream: Optional[str] = None, mode: Optional[str] = None):
+    """
+    Forward unmatched mock requests to ``upstream``.
+
+    ``mode`` is ``off``, ``proxy`` (forward only) or ``record`` (forward and
+    save each response as a mock so later requests are replayed locally).
+    """
+    try:
+        mock_proxy.configure(upstream, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return mock_proxy.stats()
+
+@app.get("/api/mocks/faults")
+async def api_mock_faults_status():
+    """Global fault rules, seed and injection counters for this process."""
+    return fault_injector.stats()
+
+@app.put("/api/mocks/faults")
+async def api_mock_faults_configure(payload: dict):
+    """
+    Set global fault rules and/or the random seed, e.g.
+    ``{"rules": [{"type": "drop", "rate": 0.05, "path": "/orders"}], "seed": 42}``.
+    """
+    return configure_faults(payload)
+
 @app.post("/api/mock")
 async def api_create_mock(payload: MockRequest):
-    """Saves a new mock configuration."""
+    """Saves a new mock configuration.
+
+    ``path`` may be an exact path, a template with ``{param}``, ``*`` or ``**``
+    segments, or an anchored regex starting with ``^``. The response body and
+    header values are templates (see ``mock_template``) compiled here, so an
+    invalid placeholder is rejected before the mock is stored, unless
+    ``static_response`` asks for them to be served verbatim.
+    """
     mock_data = payload.dict()
-    return await save_mock(mock_data)
+    try:
+        validate_mock(mock_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    saved = await save_mock(mock_data)
+    await reload_mock_index()
+    return saved
 
 
 # ---------- Project‑scoped Bugs ----------
 @app.get("/projects/{pid}/bugs")
-async def api_list_project_bugs(pid: int, q: Optional[str] = None, severity: Optional[str] = None, status: Optional[str] = None):
-    """List bugs for a project. Optionally filter by keyword in description, repro, expected or actual."""
+async def api_list_project_bugs(pid: int, request: Request, response: Response, q: Optional[str] = None, severity: Optional[str] = None, status: Optional[str] = None):
+    """List bugs for a project. Optionally filter by keyword in description, repro, expected or actual (full-text, ranked)."""
+    not_modified = _check_etag(request, response, "bugs", pid)
+    if not_modified:
+        return not_modified
     return await list_project_bugs(pid, keyword=q, severity=severity, status=status)
 
 @app.post("/projects/{pid}/bugs")
 async def api_create_project_bug(pid: int, payload: ProjectBugIn):
+    await _check_project_writable(pid)
     bug = await create_project_bug(pid, payload.dict())
     return bug
 
 @app.put("/projects/{pid}/bugs/{bug_id}")
 async def api_update_project_bug(pid: int, bug_id: int, payload: ProjectBugIn):
+    await _check_project_writable(pid)
     # State locking: prevent changes if status is '已審核'
     current_bug = await get_project_bug(pid, bug_id)
     if not current_bug:
@@ -557,6 +1149,7 @@ async def api_update_project_bug(pid: int, bug_id: int, payload: ProjectBugIn):
 
 @app.delete("/projects/{pid}/bugs/{bug_id}")
 async def api_delete_project_bug(pid: int, bug_id: int):
+    await _check_project_writable(pid)
     ok = await delete_project_bug(pid, bug_id)
     return {"ok": ok}
 
@@ -614,6 +1207,11 @@ webtest_thread = None
 apitest_running = False
 apitest_thread = None
 
+def _write_run_meta(log_dir: str, project_id: int, kind: str) -> None:
+    """Record which project a run belongs to, so its artifacts can be purged with the project."""
+    with open(os.path.join(log_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"project_id": project_id, "type": kind}, f)
+
 async def _pytest_broadcast(line: str):
     pytest_log_buffer.append(line)
     if len(pytest_log_buffer) > 500:
@@ -701,6 +1299,7 @@ def api_trigger_web(payload: dict | None = None):
     # The log directory should use the same 'ts' as the run_id to ensure logs can be found.
     log_dir = os.path.join(LOG_DIR_BASE, ts)
     os.makedirs(log_dir, exist_ok=True)
+    _write_run_meta(log_dir, project_id, "web")
     # prepare temporary JSON with selected cases
     tmp_cases_path = os.path.join(DATA_DIR, f"tmp_web_cases_{ts}.json")
     try:
@@ -741,7 +1340,7 @@ def api_trigger_web(payload: dict | None = None):
             ]
             # open a log file for writing the run output
             log_path = os.path.join(log_dir, "run.log")
-            with open(log_path, "w", encoding="utf-8") as lf:
+            with RotatingFile(log_path) as lf:
                 # spawn subprocess and stream stdout to websocket and log file
                 proc = subprocess.Popen(
                     cmd,
@@ -796,19 +1395,20 @@ def api_trigger_web(payload: dict | None = None):
                 if proc2.returncode != 0:
                     msg = proc2.stderr.strip() or proc2.stdout.strip()
                     err_msg = f"[webtest] allure generate failed: {msg}"
-                    with open(os.path.join(log_dir, "run.log"), "a", encoding="utf-8") as lf2:
+                    with RotatingFile(os.path.join(log_dir, "run.log")) as lf2:
                         lf2.write(f"{err_msg}\n")
                     asyncio.run(_pytest_broadcast(err_msg))
         except Exception as e:
             err_msg = f"[webtest] error: {e}"
             # append error to log file
             try:
-                with open(os.path.join(log_dir, "run.log"), "a", encoding="utf-8") as lf3:
+                with RotatingFile(os.path.join(log_dir, "run.log")) as lf3:
                     lf3.write(f"{err_msg}\n")
             except Exception:
                 pass
             asyncio.run(_pytest_broadcast(err_msg))
         finally:
+            _index_run_log(log_dir)
             # mark the run as finished regardless of outcome
             webtest_running = False
     # mark the global flag now so that subsequent trigger attempts are rejected
@@ -868,6 +1468,7 @@ def api_trigger_api(payload: dict | None = None):
     # The log directory should use the same 'ts' as the run_id to ensure logs can be found.
     log_dir = os.path.join(LOG_DIR_BASE, ts)
     os.makedirs(log_dir, exist_ok=True)
+    _write_run_meta(log_dir, project_id, "api")
     # prepare temporary cases file
     tmp_cases_path = os.path.join(DATA_DIR, f"tmp_api_cases_{ts}.json")
     try:
@@ -903,7 +1504,7 @@ def api_trigger_api(payload: dict | None = None):
             ]
             # open a log file for this API run
             log_path = os.path.join(log_dir, "run.log")
-            with open(log_path, "w", encoding="utf-8") as lf:
+            with RotatingFile(log_path) as lf:
                 proc = subprocess.Popen(
                     cmd,
                     cwd=ROOT_DIR,
@@ -956,18 +1557,19 @@ def api_trigger_api(payload: dict | None = None):
                 if proc2.returncode != 0:
                     msg = proc2.stderr.strip() or proc2.stdout.strip()
                     err_msg = f"[apitest] allure generate failed: {msg}"
-                    with open(os.path.join(log_dir, "run.log"), "a", encoding="utf-8") as lf2:
+                    with RotatingFile(os.path.join(log_dir, "run.log")) as lf2:
                         lf2.write(f"{err_msg}\n")
                     asyncio.run(_pytest_broadcast(err_msg))
         except Exception as e:
             err_msg = f"[apitest] error: {e}"
             try:
-                with open(os.path.join(log_dir, "run.log"), "a", encoding="utf-8") as lf3:
+                with RotatingFile(os.path.join(log_dir, "run.log")) as lf3:
                     lf3.write(f"{err_msg}\n")
             except Exception:
                 pass
             asyncio.run(_pytest_broadcast(err_msg))
         finally:
+            _index_run_log(log_dir)
             apitest_running = False
     # mark as running and start worker thread
     apitest_running = True
@@ -1025,6 +1627,7 @@ def api_trigger_app(payload: dict | None = None):
     os.makedirs(result_dir, exist_ok=True)
     os.makedirs(report_dir, exist_ok=True)
     os.makedirs(log_dir, exist_ok=True)
+    _write_run_meta(log_dir, project_id, "app")
 
     tmp_cases_path = os.path.join(DATA_DIR, f"tmp_app_cases_{ts}.json")
     try:
@@ -1052,7 +1655,7 @@ def api_trigger_app(payload: dict | None = None):
             cmd = ["pytest", script_path, "-q", f"--alluredir={result_dir}"]
             log_path = os.path.join(log_dir, "run.log")
 
-            with open(log_path, "w", encoding="utf-8") as lf:
+            with RotatingFile(log_path) as lf:
                 proc = subprocess.Popen(cmd, cwd=ROOT_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
                 for line in proc.stdout:
                     lf.write(line)
@@ -1086,18 +1689,19 @@ def api_trigger_app(payload: dict | None = None):
                 proc2 = subprocess.run(gen_cmd, capture_output=True, text=True)
                 if proc2.returncode != 0:
                     err_msg = f"[apptest] allure generate failed: {proc2.stderr.strip() or proc2.stdout.strip()}"
-                    with open(log_path, "a", encoding="utf-8") as lf2:
+                    with RotatingFile(log_path) as lf2:
                         lf2.write(f"{err_msg}\\n")
                     asyncio.run(_pytest_broadcast(err_msg))
         except Exception as e:
             err_msg = f"[apptest] error: {e}"
             try:
-                with open(os.path.join(log_dir, "run.log"), "a", encoding="utf-8") as lf3:
+                with RotatingFile(os.path.join(log_dir, "run.log")) as lf3:
                     lf3.write(f"{err_msg}\\n")
             except Exception:
                 pass
             asyncio.run(_pytest_broadcast(err_msg))
         finally:
+            _index_run_log(log_dir)
             apptest_running = False
 
     apptest_running = True
@@ -1312,6 +1916,32 @@ def api_locust_report_detail(run_id: str):
                 summary['failures'].append(row)
     return summary
 
+# ---------- Prometheus metrics ----------
+@registry.collector
+def _platform_families():
+    yield gauge("websocket_clients", "Connected WebSocket clients by channel.", [
+        ({"channel": "test-run"}, len(pytest_clients)),
+        ({"channel": "loadtest"}, len(loadtest_clients)),
+    ])
+    # Each kind runs at most one job at a time, so the run queue depth is 0 or 1 per kind.
+    yield gauge("test_runs_active", "Test runs in progress by kind.", [
+        ({"kind": "pytest"}, int(pytest_running)),
+        ({"kind": "web"}, int(webtest_running)),
+        ({"kind": "api"}, int(apitest_running)),
+        ({"kind": "app"}, int(apptest_running)),
+        ({"kind": "loadtest"}, int(loadtest_running)),
+    ])
+    yield gauge("project_purges_pending", "Project deletions still purging rows and files.", [({}, len(_purge_tasks))])
+    yield counter("query_cache_requests_total", "Read-query cache lookups.", [
+        ({"result": "hit"}, query_cache.hits),
+        ({"result": "miss"}, query_cache.misses),
+    ])
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request, storage, mock, log and run metrics of this process in Prometheus text format."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
 # ---------- Mock API Catch-all Route ----------
 # This must be the last route in the application
 @app.api_route("/{full_path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"], include_in_schema=False)
@@ -1320,89 +1950,4 @@ async def catch_all_mock_route(request: Request, full_path: str):
     This route catches all incoming requests and tries to match them against
     the saved mock configurations.
     """
-    mocks = get_all_mocks()
-    request_method = request.method
-    request_path = f"/{full_path}"
-    request_query_params = dict(request.query_params)
-    request_headers = dict(request.headers)
-
-    # Try to read body, handle potential errors
-    try:
-        request_body_bytes = await request.body()
-        request_body_str = request_body_bytes.decode('utf-8')
-    except Exception:
-        request_body_str = ""
-
-    for mock in mocks:
-        # --- Start Matching ---
-        match = True
-
-        # 1. Match Method
-        if mock.get('method', 'GET').upper() != request_method.upper():
-            match = False
-            continue
-
-        # 2. Match Path
-        if mock.get('path') != request_path:
-            match = False
-            continue
-
-        # 3. Match Query Params
-        mock_params = {p['key']: p['value'] for p in mock.get('params', []) if p.get('key')}
-        if mock_params:
-            for key, value in mock_params.items():
-                if request_query_params.get(key) != value:
-                    match = False
-                    break
-            if not match:
-                continue
-
-        # 4. Match Headers
-        mock_headers = {h['key'].lower(): h['value'] for h in mock.get('headers', []) if h.get('key')}
-        if mock_headers:
-            for key, value in mock_headers.items():
-                if request_headers.get(key) != value:
-                    match = False
-                    break
-            if not match:
-                continue
-
-        # 5. Match Body
-        mock_body = mock.get('body')
-        if mock_body:
-            # Try to compare JSON objects if both are valid JSON
-            try:
-                mock_body_json = json.loads(mock_body)
-                request_body_json = json.loads(request_body_str)
-                if mock_body_json != request_body_json:
-                    match = False
-            except (json.JSONDecodeError, TypeError):
-                # Fallback to string comparison
-                if mock_body.strip() != request_body_str.strip():
-                    match = False
-
-            if not match:
-                continue
-
-        # --- If we get here, it's a match! ---
-        if match:
-            # Get response details from mock
-            status_code = mock.get('response_status', 200)
-            delay_ms = mock.get('delay_ms', 0)
-            response_body = mock.get('response_body', '')
-            response_headers_list = mock.get('response_headers', [])
-
-            response_headers_dict = {h['key']: h['value'] for h in response_headers_list if h.get('key')}
-
-            # Apply delay
-            if delay_ms > 0:
-                await asyncio.sleep(delay_ms / 1000.0)
-
-            return Response(
-                content=response_body,
-                status_code=status_code,
-                headers=response_headers_dict
-            )
-
-    # If no mock was matched, return a default 404
-    return Response(content=f"No mock found for {request_method} {request_path}", status_code=404)
+    return await serve_mock(request, f"/{full_path}")
@@ -0,0 +1,156 @@
+"""
+Prometheus text exposition for the platform API and the mock server.
+
+Hot paths only call ``Histogram.observe``: one ``bisect`` and two in-place
+additions on a per-label-set list, with no locking (everything runs on the
+event loop). Cumulative buckets are computed when ``/metrics`` is scraped.
+Point-in-time values (WebSocket clients, running tests, mock counters) are
+read by collector callbacks at scrape time, so they cost nothing between
+scrapes.
+
+Metrics are per process; with several uvicorn workers each one reports its
+own values and a scrape reaches whichever worker accepts the connection.
+"""
+import functools
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds; spans sub-millisecond mock answers to slow report generation.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (name, type, help, [(labels, value), ...])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, labels: tuple) -> Callable:
+        """Decorator observing the duration of each call of a coroutine function."""
+        def decorate(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.observe(labels, time.perf_counter() - started)
+            return timed
+        return decorate
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        for labels, series in sorted(self._series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                total += count
+                le = 'le="' + _number(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {total}")
+            out.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labels, labels)} {total}")
+
+    def counts(self) -> Dict[tuple, int]:
+        return {labels: sum(series[:-1]) for labels, series in self._series.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.histograms: List[Histogram] = []
+        self.collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labels, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def collector(self, fn: Callable[[], Iterable[Family]]) -> Callable[[], Iterable[Family]]:
+        """Register a callback returning metric families; usable as a decorator."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        out: List[str] = []
+        for histogram in self.histograms:
+            histogram.render(out)
+        for collect in self.collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"[metrics] collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    out.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "API request latency by route template.", ("method", "route", "status"),
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Time spent holding a database connection, including waiting for it, by storage operation.", ("operation",),
+)
+mock_match_duration = registry.histogram(
+    "mock_match_duration_seconds", "Time to find the mock for a request, including reading a body needed for matching.", ("result",),
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+
+
+@registry.collector
+def _request_totals() -> Iterable[Family]:
+    yield counter(
+        "http_requests_total", "API requests by route template.",
+        [(dict(zip(http_request_duration.labels, labels)), count) for labels, count in sorted(http_request_duration.counts().items())],
+    )
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """The matched route's path template (``/api/projects/{pid}``) rather than the raw path."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+def gauge(name: str, help: str, samples: List[Tuple[Dict[str, Any], float]]) -> Family:
+    return name, "gauge", help, samples
+
+
+def counter(name: str, help: str, samples: List[Tuple[Dict[str, Any], float]]) -> Family:
+    return name, "counter", help, samples
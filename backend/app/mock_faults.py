@@ -0,0 +1,174 @@
+"""
+Fault injection for mock responses.
+
+A fault rule fires with probability ``rate`` (0..1) and changes how the
+matched mock answers::
+
+    {"type": "error", "rate": 0.1, "status": 503, "body": "overloaded"}
+    {"type": "truncate", "rate": 0.05, "fraction": 0.5}   # cut the body, valid framing
+    {"type": "malformed", "rate": 0.05}                   # body is no longer valid JSON
+    {"type": "drop", "rate": 0.02, "after_bytes": 64}     # close the connection mid-body
+    {"type": "stall", "rate": 0.01, "ms": 300000}         # hold the response until the client gives up
+
+Rules are attached to a mock (``faults`` column) or set globally through
+``/api/mocks/faults`` / ``/__mock/faults`` or the ``MOCK_FAULTS`` environment
+variable (a JSON list). Global rules may be limited with ``method`` and a
+``path`` prefix. A mock's own rules are tried before global ones and the
+first rule that fires wins.
+
+Decisions come from one ``random.Random`` seeded with ``MOCK_FAULT_SEED``
+(or a seed set at runtime), which also seeds latency profiles, so a run with
+the same seed and request order injects the same faults.
+"""
+import asyncio
+import json
+import os
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi.responses import Response, StreamingResponse
+
+from .mock_shaping import seed_latency
+
+FAULT_TYPES = ("error", "truncate", "malformed", "drop", "stall")
+MOCK_FAULT_STALL_MS = int(os.getenv("MOCK_FAULT_STALL_MS", "300000"))
+
+
+class InjectedDisconnect(Exception):
+    """Raised inside a streaming body where a drop fault cuts it; the mock server then aborts the connection."""
+
+
+def _rate(spec: Dict[str, Any]) -> float:
+    rate = spec.get("rate", 1.0)
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+        raise ValueError("fault rate must be a number between 0 and 1")
+    return float(rate)
+
+
+class FaultRule:
+    __slots__ = ("type", "rate", "status", "body", "fraction", "after_bytes", "ms", "method", "path", "spec")
+
+    def __init__(self, spec: Dict[str, Any]):
+        if not isinstance(spec, dict):
+            raise ValueError("fault rules must be objects")
+        self.type = spec.get("type")
+        if self.type not in FAULT_TYPES:
+            raise ValueError(f"fault type must be one of {', '.join(FAULT_TYPES)}")
+        self.rate = _rate(spec)
+        self.status = int(spec.get("status", 500))
+        if not 100 <= self.status <= 599:
+            raise ValueError("fault status must be an HTTP status code")
+        self.body = spec.get("body", "Injected fault")
+        self.fraction = float(spec.get("fraction", 0.5))
+        if not 0 <= self.fraction < 1:
+            raise ValueError("fault fraction must be in [0, 1)")
+        self.after_bytes = int(spec.get("after_bytes", 0))
+        self.ms = int(spec.get("ms", MOCK_FAULT_STALL_MS))
+        if self.after_bytes < 0 or self.ms < 0:
+            raise ValueError("fault after_bytes and ms must be non-negative")
+        self.method = spec["method"].upper() if spec.get("method") else None
+        self.path = spec.get("path")
+        self.spec = spec
+
+    def applies(self, method: str, path: str) -> bool:
+        if self.method and self.method != method:
+            return False
+        if self.path and not path.startswith(self.path):
+            return False
+        return True
+
+
+def compile_faults(specs: Optional[Sequence[Dict[str, Any]]]) -> tuple:
+    """Validate fault rule dicts; raises ``ValueError`` for an invalid rule."""
+    if not specs:
+        return ()
+    if not isinstance(specs, (list, tuple)):
+        raise ValueError("faults must be a list of rules")
+    try:
+        return tuple(FaultRule(spec) for spec in specs)
+    except TypeError as e:
+        raise ValueError(f"invalid fault rule: {e}") from e
+
+
+def _malform(body: bytes, rng: random.Random) -> bytes:
+    if not body:
+        return b"{"
+    cut = rng.randrange(len(body))
+    return body[:cut] + b"\x00}{" + body[cut:]
+
+
+async def _drop_after(body: bytes) -> Any:
+    if body:
+        yield body
+    raise InjectedDisconnect("connection dropped by fault injection")
+
+
+class FaultInjector:
+    def __init__(self):
+        seed = os.getenv("MOCK_FAULT_SEED")
+        self.seed: Optional[int] = int(seed) if seed else None
+        self.rng = random.Random(self.seed)
+        seed_latency(self.seed)
+        try:
+            self.rules = compile_faults(json.loads(os.getenv("MOCK_FAULTS", "[]")))
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"[mock-faults] ignoring MOCK_FAULTS: {e}")
+            self.rules = ()
+        self.evaluated = 0
+        self.injected: Counter = Counter()
+        self.by_mock: Counter = Counter()
+        # Drop faults whose connection was actually aborted (the client may leave first).
+        self.disconnects = 0
+
+    def configure(self, rules: Optional[List[Dict[str, Any]]] = None, seed: Optional[int] = None, reseed: bool = False) -> None:
+        if rules is not None:
+            self.rules = compile_faults(rules)
+        if reseed:
+            self.seed = seed
+            self.rng.seed(seed)
+            seed_latency(seed)
+
+    def pick(self, mock_rules: tuple, mock_id: Optional[int], method: str, path: str) -> Optional[FaultRule]:
+        """Return the first rule that fires for this request, or None."""
+        if not mock_rules and not self.rules:
+            return None
+        self.evaluated += 1
+        for rule in mock_rules + self.rules:
+            if rule.applies(method, path) and self.rng.random() < rule.rate:
+                self.injected[rule.type] += 1
+                if mock_id is not None:
+                    self.by_mock[mock_id] += 1
+                return rule
+        return None
+
+    async def apply(self, rule: FaultRule, body: bytes, status: int, headers: Dict[str, str]) -> Response:
+        """Build the faulty response for ``rule``."""
+        if rule.type == "error":
+            return Response(content=rule.body, status_code=rule.status)
+        if rule.type == "truncate":
+            return Response(content=body[:int(len(body) * rule.fraction)], status_code=status, headers=headers)
+        if rule.type == "malformed":
+            return Response(content=_malform(body, self.rng), status_code=status, headers=headers)
+        if rule.type == "drop":
+            # Announce the whole body so the client sees a short read when the connection drops
+            headers = {k: v for k, v in headers.items() if k.lower() != "content-length"}
+            headers["content-length"] = str(len(body))
+            return StreamingResponse(_drop_after(body[:rule.after_bytes]), status_code=status, headers=headers)
+        # stall: hold the request; most clients time out first
+        await asyncio.sleep(rule.ms / 1000.0)
+        return Response(content=body, status_code=status, headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "seed": self.seed,
+            "rules": [rule.spec for rule in self.rules],
+            "evaluated": self.evaluated,
+            "injected": dict(self.injected),
+            "injected_total": sum(self.injected.values()),
+            "disconnects": self.disconnects,
+            "top_mocks": [{"id": k, "faults": v} for k, v in self.by_mock.most_common(20)],
+        }
+
+
+fault_injector = FaultInjector()
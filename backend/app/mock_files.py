@@ -0,0 +1,153 @@
+"""
+File-backed mock bodies.
+
+A mock with ``body_file`` set (a path relative to ``DATA_DIR``) serves that
+file instead of ``response_body``. The file is memory-mapped and sent in
+slices of at most ``MOCK_FILE_CHUNK_SIZE`` bytes, so a 500 MB download never
+holds more than one chunk of Python-visible data and the mapped pages are
+shared with the OS page cache. Single ``Range: bytes=...`` requests are
+answered with 206 and ``Content-Range``; unsatisfiable ranges get 416.
+"""
+import mimetypes
+import mmap
+import os
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+
+from .database import DATA_DIR
+from .mock_shaping import paced
+
+MOCK_FILE_CHUNK_SIZE = int(os.getenv("MOCK_FILE_CHUNK_SIZE", str(256 * 1024)))
+_DATA_ROOT = os.path.realpath(DATA_DIR)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def body_file_path(relative: str) -> str:
+    """Absolute path of a body file; ``ValueError`` if it escapes DATA_DIR."""
+    path = os.path.realpath(os.path.join(_DATA_ROOT, relative))
+    if os.path.commonpath([path, _DATA_ROOT]) != _DATA_ROOT:
+        raise ValueError("body_file must be inside DATA_DIR")
+    return path
+
+
+def resolve_body_file(relative: str) -> str:
+    """Like ``body_file_path`` but the file must also exist (checked when saving a mock)."""
+    path = body_file_path(relative)
+    if not os.path.isfile(path):
+        raise ValueError(f"body_file {relative!r} does not exist under DATA_DIR")
+    return path
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range into an inclusive ``(start, end)``.
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (the whole file is sent then, as RFC 9110 allows) and raises
+    ``RangeNotSatisfiable`` when the range lies outside the file.
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, _, last = value[6:].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+async def mmap_chunks(path: str, start: int, end: int, chunk_size: int = MOCK_FILE_CHUNK_SIZE) -> AsyncIterator[memoryview]:
+    """
+    Yield zero-copy views of bytes ``start..end`` (inclusive) of a mapped file.
+
+    Chunks are not released here: middleware may still hold one after the
+    next is requested, so each view lives until its last reader drops it.
+    """
+    if end < start:
+        return
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            for offset in range(start, end + 1, chunk_size):
+                chunk = view[offset:min(offset + chunk_size, end + 1)]
+                yield chunk
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                # A chunk is still referenced downstream; the map is closed when it is collected.
+                pass
+
+
+async def _finishing(chunks: AsyncIterator[memoryview], status: int, on_done: Optional[Callable[[int], None]], error: Optional[Exception]) -> AsyncIterator[memoryview]:
+    try:
+        async for chunk in chunks:
+            yield chunk
+        if error is not None:
+            raise error
+    finally:
+        if on_done is not None:
+            on_done(status)
+
+
+def file_response(
+    path: str,
+    method: str,
+    status: int,
+    headers: Dict[str, str],
+    range_header: Optional[str] = None,
+    kbps: int = 0,
+    limit: Optional[int] = None,
+    error: Optional[Exception] = None,
+    on_done: Optional[Callable[[int], None]] = None,
+) -> Response:
+    """
+    Stream a body file with Range support.
+
+    ``limit`` cuts the body after that many bytes (while still announcing the
+    full length, so the client sees a short read) and ``error`` is raised
+    after the last chunk; both are used by fault injection. ``kbps`` paces the
+    stream like ``bandwidth_kbps`` does for inline bodies. ``on_done`` gets
+    the final status once the body has been sent.
+    """
+    size = os.path.getsize(path)
+    headers = {k.lower(): v for k, v in headers.items()}
+    headers.setdefault("content-type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+    headers["accept-ranges"] = "bytes"
+    start, end = 0, size - 1
+    if status == 200:
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            if on_done is not None:
+                on_done(416)
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    if method == "HEAD":
+        if on_done is not None:
+            on_done(status)
+        return Response(status_code=status, headers=headers)
+
+    stop = end if limit is None else min(end, start + limit - 1)
+    chunks = mmap_chunks(path, start, stop)
+    if kbps:
+        chunks = paced(chunks, kbps)
+    return StreamingResponse(_finishing(chunks, status, on_done, error), status_code=status, headers=headers)
@@ -0,0 +1,165 @@
+"""
+Bounded in-memory journal of requests answered by the mock server.
+
+Entries live in a ``deque(maxlen=MOCK_JOURNAL_SIZE)``: appending is O(1), the
+oldest entry falls off when the journal is full, and because recording and
+querying never await, the event loop serialises them without a lock.
+
+With ``MOCK_JOURNAL_PERSIST=1`` a background task copies new entries to the
+``mock_journal`` table every ``MOCK_JOURNAL_FLUSH_INTERVAL`` seconds, so
+journals from several mock server processes can be queried in one place.
+
+Credentials are never kept: values of the headers in
+``MOCK_JOURNAL_REDACT_HEADERS`` are replaced before an entry is recorded, so
+they reach neither the journal endpoints nor the table.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .storage import save_mock_journal
+
+MOCK_JOURNAL_SIZE = int(os.getenv("MOCK_JOURNAL_SIZE", "1000"))
+MOCK_JOURNAL_PERSIST = os.getenv("MOCK_JOURNAL_PERSIST", "0") not in ("", "0", "false", "False")
+MOCK_JOURNAL_FLUSH_INTERVAL = float(os.getenv("MOCK_JOURNAL_FLUSH_INTERVAL", "2.0"))
+# Rows kept in the mock_journal table; older rows are trimmed on flush.
+MOCK_JOURNAL_DB_MAX = int(os.getenv("MOCK_JOURNAL_DB_MAX", "100000"))
+# Comma-separated header names whose values are replaced before recording.
+MOCK_JOURNAL_REDACT_HEADERS = frozenset(
+    name.strip().lower()
+    for name in os.getenv(
+        "MOCK_JOURNAL_REDACT_HEADERS",
+        "authorization,proxy-authorization,cookie,set-cookie,x-api-key,x-auth-token",
+    ).split(",")
+    if name.strip()
+)
+REDACTED = "[redacted]"
+
+
+class JournalEntry:
+    __slots__ = ("seq", "ts", "method", "path", "query", "headers", "body_digest", "mock_id", "status", "latency_ms")
+
+    def __init__(self, seq, ts, method, path, query, headers, body_digest, mock_id, status, latency_ms):
+        self.seq = seq
+        self.ts = ts
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body_digest = body_digest
+        self.mock_id = mock_id
+        self.status = status
+        self.latency_ms = latency_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def journal_digest(body: Optional[str]) -> Optional[str]:
+    if not body:
+        return None
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def redact_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {
+        name: REDACTED if name.lower() in MOCK_JOURNAL_REDACT_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+def _matches(entry: Dict[str, Any], method, path, mock_id, matched, status, since) -> bool:
+    if method and entry["method"] != method:
+        return False
+    if path and path not in entry["path"]:
+        return False
+    if mock_id is not None and entry["mock_id"] != mock_id:
+        return False
+    if matched is not None and (entry["mock_id"] is not None) != matched:
+        return False
+    if status is not None and entry["status"] != status:
+        return False
+    if since is not None and entry["ts"] < since:
+        return False
+    return True
+
+
+class MockJournal:
+    def __init__(self, capacity: int = MOCK_JOURNAL_SIZE):
+        self.entries: deque = deque(maxlen=capacity)
+        self.seq = 0
+        self.flushed_seq = 0
+        # Entries overwritten before the write-behind task could persist them.
+        self.lost = 0
+
+    def record(self, method, path, query, headers, body_digest, mock_id, status, latency_ms) -> None:
+        if self.entries.maxlen == 0:
+            return
+        self.seq += 1
+        if MOCK_JOURNAL_PERSIST and len(self.entries) == self.entries.maxlen and self.entries[0].seq > self.flushed_seq:
+            self.lost += 1
+        self.entries.append(JournalEntry(self.seq, time.time(), method, path, query, redact_headers(headers), body_digest, mock_id, status, latency_ms))
+
+    def query(
+        self,
+        method: Optional[str] = None,
+        path: Optional[str] = None,
+        mock_id: Optional[int] = None,
+        matched: Optional[bool] = None,
+        status: Optional[int] = None,
+        since: Optional[float] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """Newest-first entries matching every given filter (``path`` is a substring)."""
+        method = method.upper() if method else None
+        result = []
+        for entry in reversed(self.entries):
+            item = entry.to_dict()
+            if _matches(item, method, path, mock_id, matched, status, since):
+                result.append(item)
+                if len(result) >= limit:
+                    break
+        return result
+
+    def pending(self) -> List[JournalEntry]:
+        """Entries not yet written to the database, oldest first."""
+        return [entry for entry in self.entries if entry.seq > self.flushed_seq]
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.entries.maxlen,
+            "size": len(self.entries),
+            "recorded": self.seq,
+            "persist": MOCK_JOURNAL_PERSIST,
+            "flushed": self.flushed_seq,
+            "lost": self.lost,
+        }
+
+
+mock_journal = MockJournal()
+
+
+async def flush_journal() -> int:
+    """Write pending entries to the ``mock_journal`` table; returns rows written."""
+    entries = mock_journal.pending()
+    if not entries:
+        return 0
+    await save_mock_journal([entry.to_dict() for entry in entries], keep=MOCK_JOURNAL_DB_MAX)
+    mock_journal.flushed_seq = entries[-1].seq
+    return len(entries)
+
+
+async def journal_writer() -> None:
+    """Write-behind loop; cancel it and call ``flush_journal`` once more on shutdown."""
+    while True:
+        await asyncio.sleep(MOCK_JOURNAL_FLUSH_INTERVAL)
+        try:
+            await flush_journal()
+        except Exception as e:
+            print(f"[mock-journal] flush failed: {e}")
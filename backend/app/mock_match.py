@@ -0,0 +1,238 @@
+"""
+Partial JSON body matching for mocks.
+
+``body_match`` is compiled once when a mock is saved or loaded::
+
+    {"subset": {"user": {"id": 42}}}                     # request JSON contains this
+    {"jsonpath": ["$.user.id == 42", "$.items[*].sku in [\"A\", \"B\"]"]}
+    {"jsonpath": [{"path": "$.total", "op": ">", "value": 100}]}
+
+Both keys may be combined; every condition must hold. ``subset`` compares
+objects by key (extra request keys are ignored), lists element by element
+and scalars by value. JSONPath supports ``$``, ``.key``, ``['key']``,
+``[n]`` and ``[*]``/``.*``; with wildcards a predicate holds if any selected
+value satisfies it. Operators: ``== != > >= < <= in contains =~ exists``.
+
+Equality conditions on plain paths double as discriminators: the routing
+index buckets body-matched mocks by the value at the most common such path,
+so a request is only checked against mocks that can match it.
+"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_STEP = re.compile(r"""\.(\*|[A-Za-z_][\w-]*)|\[(\*|-?\d+|'[^']*'|"[^"]*")\]""")
+_PREDICATE = re.compile(r"^\s*(\$\S*)\s*(==|!=|>=|<=|>|<|=~|\bin\b|\bcontains\b|\bexists\b)\s*(.*?)\s*$")
+_WILD = ("*",)
+
+# Marker for a request body that is not valid JSON.
+NOT_JSON = object()
+_UNPARSED = object()
+
+
+class ParsedBody:
+    """Request body text with its JSON parse done at most once."""
+
+    __slots__ = ("text", "_value")
+
+    def __init__(self, text: Optional[str]):
+        self.text = text
+        self._value = _UNPARSED
+
+    @property
+    def value(self) -> Any:
+        """The body parsed as JSON, or ``NOT_JSON``."""
+        if self._value is _UNPARSED:
+            try:
+                self._value = json.loads(self.text or "")
+            except (json.JSONDecodeError, TypeError):
+                self._value = NOT_JSON
+        return self._value
+
+
+def compile_path(path: str) -> Tuple:
+    """Compile a JSONPath into a tuple of steps (keys, list indexes or ``_WILD``)."""
+    if not isinstance(path, str) or not path.startswith("$"):
+        raise ValueError(f"JSONPath must start with '$': {path!r}")
+    steps, pos = [], 1
+    while pos < len(path):
+        m = _STEP.match(path, pos)
+        if not m:
+            raise ValueError(f"Unsupported JSONPath syntax at {path[pos:]!r}")
+        token = m.group(1) if m.group(1) is not None else m.group(2)
+        if token == "*":
+            steps.append(_WILD)
+        elif token[0] in "'\"":
+            steps.append(token[1:-1])
+        elif m.group(2) is not None:
+            steps.append(int(token))
+        else:
+            steps.append(token)
+        pos = m.end()
+    return tuple(steps)
+
+
+def select_values(doc: Any, steps: Tuple) -> List[Any]:
+    """All values at ``steps`` in ``doc`` (empty when the path is missing)."""
+    current = [doc]
+    for step in steps:
+        following = []
+        for node in current:
+            if step is _WILD:
+                if isinstance(node, dict):
+                    following.extend(node.values())
+                elif isinstance(node, list):
+                    following.extend(node)
+            elif isinstance(step, int):
+                if isinstance(node, list) and -len(node) <= step < len(node):
+                    following.append(node[step])
+            elif isinstance(node, dict) and step in node:
+                following.append(node[step])
+        current = following
+        if not current:
+            break
+    return current
+
+
+def _same(expected: Any, actual: Any) -> bool:
+    # JSON true must not equal 1
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return isinstance(expected, bool) and isinstance(actual, bool) and expected == actual
+    return expected == actual
+
+
+def is_subset(expected: Any, actual: Any) -> bool:
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(k in actual and is_subset(v, actual[k]) for k, v in expected.items())
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and all(map(is_subset, expected, actual))
+    return _same(expected, actual)
+
+
+def canonical(value: Any) -> str:
+    """Hashable key for a JSON value, treating 42 and 42.0 alike."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def _compare(op: str, expected: Any) -> Callable[[Any], bool]:
+    if op == "==":
+        return lambda v: _same(expected, v)
+    if op == "!=":
+        return lambda v: not _same(expected, v)
+    if op in (">", ">=", "<", "<="):
+        if isinstance(expected, bool) or not isinstance(expected, (int, float, str)):
+            raise ValueError(f"'{op}' needs a number or string")
+        kind = str if isinstance(expected, str) else (int, float)
+
+        def ordered(v: Any) -> bool:
+            if isinstance(v, bool) or not isinstance(v, kind):
+                return False
+            return {">": v > expected, ">=": v >= expected, "<": v < expected, "<=": v <= expected}[op]
+
+        return ordered
+    if op == "in":
+        if not isinstance(expected, list):
+            raise ValueError("'in' needs a list")
+        return lambda v: any(_same(e, v) for e in expected)
+    if op == "contains":
+        return lambda v: (isinstance(v, str) and isinstance(expected, str) and expected in v) or (
+            isinstance(v, list) and any(_same(expected, item) for item in v)
+        )
+    if op == "=~":
+        if not isinstance(expected, str):
+            raise ValueError("'=~' needs a regex string")
+        try:
+            rx = re.compile(expected)
+        except re.error as e:
+            raise ValueError(f"Invalid regex {expected!r}: {e}") from e
+        return lambda v: isinstance(v, str) and rx.search(v) is not None
+    raise ValueError(f"Unknown operator {op!r}")
+
+
+class Predicate:
+    __slots__ = ("steps", "op", "value", "test", "source")
+
+    def __init__(self, path: str, op: str, value: Any, source: Any):
+        self.steps = compile_path(path)
+        self.op = op
+        self.value = value
+        self.source = source
+        self.test = None if op == "exists" else _compare(op, value)
+
+    def __call__(self, doc: Any) -> bool:
+        values = select_values(doc, self.steps)
+        if self.op == "exists":
+            return bool(values) == (self.value is not False)
+        return any(self.test(v) for v in values)
+
+
+def _parse_predicate(spec: Any) -> Predicate:
+    if isinstance(spec, str):
+        m = _PREDICATE.match(spec)
+        if not m:
+            raise ValueError(f"Cannot parse predicate {spec!r}; expected '$.path <op> <json value>'")
+        path, op, raw = m.groups()
+        if op == "exists" and not raw:
+            value = True
+        else:
+            try:
+                value = json.loads(raw)
+            except json.JSONDecodeError:
+                value = raw  # bare words compare as strings
+        return Predicate(path, op, value, spec)
+    if isinstance(spec, dict):
+        return Predicate(spec.get("path"), spec.get("op", "=="), spec.get("value", True), spec)
+    raise ValueError("JSONPath predicates must be strings or objects")
+
+
+def _leaf_equalities(expected: Any, steps: Tuple = ()) -> List[Tuple[Tuple, str]]:
+    if isinstance(expected, dict):
+        pairs = []
+        for key, value in expected.items():
+            pairs.extend(_leaf_equalities(value, steps + (key,)))
+        return pairs
+    if isinstance(expected, list):
+        pairs = []
+        for index, value in enumerate(expected):
+            pairs.extend(_leaf_equalities(value, steps + (index,)))
+        return pairs
+    return [(steps, canonical(expected))]
+
+
+class BodyMatcher:
+    """Compiled ``body_match``: a subset document and/or JSONPath predicates."""
+
+    __slots__ = ("subset", "predicates", "equalities")
+
+    def __init__(self, spec: Dict[str, Any]):
+        if not isinstance(spec, dict) or not set(spec) <= {"subset", "jsonpath"} or not spec:
+            raise ValueError("body_match must be an object with 'subset' and/or 'jsonpath'")
+        self.subset = spec.get("subset")
+        raw = spec.get("jsonpath") or []
+        if not isinstance(raw, list):
+            raw = [raw]
+        self.predicates = [_parse_predicate(p) for p in raw]
+        # (path steps, canonical value) pairs every matching body must have; used as index keys
+        equalities = _leaf_equalities(self.subset) if self.subset is not None else []
+        equalities += [
+            (p.steps, canonical(p.value)) for p in self.predicates
+            if p.op == "==" and _WILD not in p.steps and not isinstance(p.value, (dict, list))
+        ]
+        self.equalities = equalities
+
+    def matches(self, body: ParsedBody) -> bool:
+        doc = body.value
+        if doc is NOT_JSON:
+            return False
+        if self.subset is not None and not is_subset(self.subset, doc):
+            return False
+        return all(predicate(doc) for predicate in self.predicates)
+
+
+def compile_body_match(spec: Optional[Dict[str, Any]]) -> Optional[BodyMatcher]:
+    """Compile a ``body_match`` spec; None when empty, ``ValueError`` when invalid."""
+    if not spec:
+        return None
+    return BodyMatcher(spec)
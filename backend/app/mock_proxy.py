@@ -0,0 +1,218 @@
+"""
+Record-and-replay proxy for requests that no mock matches.
+
+Modes (``MOCK_PROXY_MODE``, changeable at runtime through the proxy endpoints):
+
+* ``off``    -- unmatched requests get the usual 404.
+* ``proxy``  -- unmatched requests are forwarded to ``MOCK_PROXY_UPSTREAM``.
+* ``record`` -- as ``proxy``, and every upstream response is saved as a mock
+  (method, path, query params and body as matchers; status, headers, body and
+  the observed latency as the response). Recorded mocks are written in batches
+  and the routing index is reloaded, so repeated requests are replayed from
+  memory without calling the upstream again.
+
+Recordings replay exactly what was seen: paths containing ``{``, ``*`` or a
+leading ``^`` are stored as escaped regexes, responses are marked
+``static_response`` so ``{{...}}`` in an upstream body is not rendered, and
+each mock passes the same validation as one created through the API.
+
+Upstream calls share one pooled ``httpx.AsyncClient`` per process.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import Request
+from fastapi.responses import Response
+
+from .storage import save_mocks
+from .mock_journal import journal_digest
+from .mock_router import literal_path, validate_mock
+
+MOCK_PROXY_UPSTREAM = os.getenv("MOCK_PROXY_UPSTREAM", "")
+MOCK_PROXY_MODE = os.getenv("MOCK_PROXY_MODE", "record" if MOCK_PROXY_UPSTREAM else "off")
+MOCK_PROXY_TIMEOUT = float(os.getenv("MOCK_PROXY_TIMEOUT", "30"))
+MOCK_PROXY_MAX_CONNECTIONS = int(os.getenv("MOCK_PROXY_MAX_CONNECTIONS", "100"))
+# Recorded mocks are saved once this many are pending or after the interval.
+MOCK_PROXY_BATCH_SIZE = int(os.getenv("MOCK_PROXY_BATCH_SIZE", "50"))
+MOCK_PROXY_FLUSH_INTERVAL = float(os.getenv("MOCK_PROXY_FLUSH_INTERVAL", "1.0"))
+# Responses larger than this are proxied but not recorded.
+MOCK_PROXY_MAX_RECORD_BYTES = int(os.getenv("MOCK_PROXY_MAX_RECORD_BYTES", str(1024 * 1024)))
+
+PROXY_MODES = ("off", "proxy", "record")
+
+# Headers that describe one connection/hop and must not be forwarded or replayed.
+_HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+# httpx decodes the upstream body, so its encoding and framing headers no longer apply;
+# date/server would be stale when replayed.
+_NOT_REPLAYED = _HOP_BY_HOP | {"content-encoding", "date", "server"}
+
+
+class MockProxy:
+    def __init__(self, upstream: str = MOCK_PROXY_UPSTREAM, mode: str = MOCK_PROXY_MODE):
+        self.upstream = upstream.rstrip("/")
+        self.mode = mode if mode in PROXY_MODES else "off"
+        self.client: Optional[httpx.AsyncClient] = None
+        self.pending: List[Dict[str, Any]] = []
+        # Requests already recorded but not yet in the routing index.
+        self._recording: set = set()
+        self._flush_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._on_saved: Optional[Callable[[], Awaitable[None]]] = None
+        self.forwarded = 0
+        self.recorded = 0
+        self.saved = 0
+        self.rejected = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off" and bool(self.upstream)
+
+    def configure(self, upstream: Optional[str] = None, mode: Optional[str] = None) -> None:
+        if mode is not None:
+            if mode not in PROXY_MODES:
+                raise ValueError(f"mode must be one of {', '.join(PROXY_MODES)}")
+            self.mode = mode
+        if upstream is not None:
+            if upstream and not upstream.startswith(("http://", "https://")):
+                raise ValueError("upstream must be an http(s) URL")
+            self.upstream = upstream.rstrip("/")
+
+    async def start(self, on_saved: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """Open the pooled client and start the batch writer; ``on_saved`` runs after each batch."""
+        self._on_saved = on_saved
+        self.client = httpx.AsyncClient(
+            timeout=MOCK_PROXY_TIMEOUT,
+            limits=httpx.Limits(max_connections=MOCK_PROXY_MAX_CONNECTIONS, max_keepalive_connections=MOCK_PROXY_MAX_CONNECTIONS),
+            follow_redirects=False,
+        )
+        self._flush_event = asyncio.Event()
+        self._task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"[mock-proxy] final flush failed: {e}")
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def forward(self, request: Request, request_path: str, body: bytes) -> Response:
+        """Send the request upstream and return its response, recording it in ``record`` mode."""
+        if self.client is None:
+            return Response(content="Mock proxy is not running", status_code=502)
+        url = self.upstream + request_path
+        if request.url.query:
+            url += "?" + request.url.query
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in _HOP_BY_HOP]
+        started = time.perf_counter()
+        try:
+            upstream = await self.client.request(request.method, url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            self.errors += 1
+            return Response(content=f"Mock proxy upstream error: {e}", status_code=502)
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.forwarded += 1
+
+        response_headers = [(k, v) for k, v in upstream.headers.multi_items() if k.lower() not in _NOT_REPLAYED]
+        if self.mode == "record":
+            self._record(request, request_path, body, upstream, response_headers, latency_ms)
+        response = Response(content=upstream.content, status_code=upstream.status_code)
+        for key, value in response_headers:
+            response.headers.append(key, value)
+        return response
+
+    def _record(self, request: Request, request_path: str, body: bytes, upstream: httpx.Response, response_headers: list, latency_ms: float) -> None:
+        if len(upstream.content) > MOCK_PROXY_MAX_RECORD_BYTES:
+            return
+        try:
+            request_body = body.decode("utf-8")
+            response_body = upstream.content.decode("utf-8")
+        except UnicodeDecodeError:
+            # Mocks store text bodies only.
+            return
+        key = (request.method, request_path, request.url.query, journal_digest(request_body))
+        if key in self._recording:
+            return
+        mock = {
+            "path": literal_path(request_path),
+            "method": request.method,
+            "params": [{"key": k, "value": v} for k, v in request.query_params.multi_items()],
+            "headers": [],
+            "body": request_body or None,
+            "response_status": upstream.status_code,
+            "response_headers": [{"key": k, "value": v} for k, v in response_headers],
+            "response_body": response_body,
+            "delay_ms": int(round(latency_ms)),
+            "static_response": True,
+        }
+        try:
+            validate_mock(mock)
+        except ValueError as e:
+            self.rejected += 1
+            print(f"[mock-proxy] not recording {request.method} {request_path}: {e}")
+            return
+        self._recording.add(key)
+        mock["_key"] = key
+        self.pending.append(mock)
+        self.recorded += 1
+        if len(self.pending) >= MOCK_PROXY_BATCH_SIZE and self._flush_event is not None:
+            self._flush_event.set()
+
+    async def flush(self) -> int:
+        """Save pending recordings in one transaction and reload the routing index."""
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, []
+        keys = [mock.pop("_key") for mock in batch]
+        try:
+            await save_mocks(batch)
+        except Exception:
+            # Put the batch back so the next flush retries it.
+            for mock, key in zip(batch, keys):
+                mock["_key"] = key
+            self.pending = batch + self.pending
+            raise
+        self.saved += len(batch)
+        if self._on_saved is not None:
+            await self._on_saved()
+        self._recording.difference_update(keys)
+        return len(batch)
+
+    async def _writer(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), MOCK_PROXY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[mock-proxy] saving recorded mocks failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "upstream": self.upstream,
+            "enabled": self.enabled,
+            "forwarded": self.forwarded,
+            "recorded": self.recorded,
+            "saved": self.saved,
+            "rejected": self.rejected,
+            "pending": len(self.pending),
+            "errors": self.errors,
+        }
+
+
+mock_proxy = MockProxy()
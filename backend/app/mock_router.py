@@ -0,0 +1,451 @@
+import hashlib
+import heapq
+import itertools
+import json
+import re
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .mock_template import RequestContext, Template, compile_template, static_template
+from .mock_shaping import compile_latency, validate_bandwidth
+from .mock_faults import compile_faults
+from .mock_files import body_file_path, resolve_body_file
+from .mock_match import BodyMatcher, ParsedBody, canonical, compile_body_match, select_values
+
+_PARAM_SEGMENT = re.compile(r"^\{(\w+)\}$")
+_SEGMENT_TOKEN = re.compile(r"(\{\w+\}|\*)")
+
+
+def body_digest(text: str) -> bytes:
+    """
+    Canonical digest of a request/mock body.
+
+    JSON bodies are re-serialised with sorted keys and no whitespace so that
+    formatting differences do not matter; anything else is compared as stripped
+    text, mirroring the original matching rules.
+    """
+    try:
+        canonical = json.dumps(json.loads(text), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except (json.JSONDecodeError, TypeError):
+        canonical = text.strip()
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+def _pairs(items: Optional[List[dict]], lower: bool = False) -> tuple:
+    """Turn the UI's ``[{"key": .., "value": ..}]`` rows into a tuple of (key, value)."""
+    pairs = []
+    for item in items or []:
+        key = item.get("key")
+        if key:
+            pairs.append((key.lower() if lower else key, item.get("value")))
+    return tuple(pairs)
+
+
+def _template(text: str) -> Template:
+    """Compile a response template; mocks saved before templating render verbatim."""
+    try:
+        return compile_template(text)
+    except ValueError:
+        return static_template(text)
+
+
+def validate_templates(response_body: Optional[str], response_headers: Optional[List[dict]]) -> None:
+    """Raise ``ValueError`` if a response body or header value is not a valid template."""
+    compile_template(response_body or "")
+    for _, value in _pairs(response_headers):
+        if isinstance(value, str):
+            compile_template(value)
+
+
+def _segments(path: str) -> List[str]:
+    return path.lstrip("/").split("/")
+
+
+def _compile_segment(segment: str) -> Tuple[str, Any]:
+    """
+    Classify one path segment of a mock template.
+
+    ``{name}`` captures a whole segment, ``*`` matches any single segment and
+    ``**`` any number of segments; segments mixing literals with ``{name}``
+    or ``*`` (e.g. ``report-{id}.json``) become a per-segment regex.
+    """
+    if segment == "**":
+        return "rest", "**"
+    if segment == "*":
+        return "star", "*"
+    m = _PARAM_SEGMENT.match(segment)
+    if m:
+        return "param", m.group(1)
+    if "{" in segment or "*" in segment:
+        pattern = ""
+        for token in _SEGMENT_TOKEN.split(segment):
+            if token == "*":
+                pattern += "[^/]*"
+            elif _PARAM_SEGMENT.match(token):
+                pattern += f"(?P<{token[1:-1]}>[^/]+?)"
+            else:
+                pattern += re.escape(token)
+        return "pattern", re.compile(pattern)
+    return "static", segment
+
+
+def path_kind(path: str) -> str:
+    """Return ``"exact"``, ``"template"`` or ``"regex"`` for a mock path."""
+    if path.startswith("^"):
+        return "regex"
+    if any(_compile_segment(seg)[0] != "static" for seg in _segments(path)):
+        return "template"
+    return "exact"
+
+
+def validate_path(path: str) -> None:
+    """Raise ``ValueError`` if a mock path cannot be compiled."""
+    try:
+        if path_kind(path) == "regex":
+            re.compile(path)
+        else:
+            for seg in _segments(path):
+                _compile_segment(seg)
+    except re.error as e:
+        raise ValueError(f"Invalid mock path {path!r}: {e}") from e
+
+
+def validate_mock(mock: Dict[str, Any]) -> None:
+    """Raise ``ValueError`` if a mock definition could not be served as saved."""
+    validate_path(mock.get("path") or "")
+    if not mock.get("static_response"):
+        validate_templates(mock.get("response_body"), mock.get("response_headers"))
+    compile_latency(mock.get("latency_profile"))
+    validate_bandwidth(mock.get("bandwidth_kbps"))
+    compile_faults(mock.get("faults"))
+    if mock.get("body_file"):
+        resolve_body_file(mock["body_file"])
+    if mock.get("body_match") and mock.get("body"):
+        raise ValueError("Use either body or body_match, not both")
+    compile_body_match(mock.get("body_match"))
+
+
+def literal_path(path: str) -> str:
+    """A mock path that matches ``path`` exactly, even if it contains ``{``, ``*`` or a leading ``^``."""
+    if path_kind(path) == "exact":
+        return path
+    return "^" + re.escape(path) + "$"
+
+
+class CompiledMock:
+    """A mock definition with its matchers and response pre-built at save time."""
+
+    __slots__ = (
+        "id", "params", "multi_params", "headers", "body_digest", "body_match", "status", "response_headers", "response_body",
+        "body_template", "header_templates", "needs_body", "counter", "delay_ms", "latency",
+        "bandwidth_kbps", "faults", "body_file", "definition",
+    )
+
+    def __init__(self, mock: Dict[str, Any], counter: Optional["itertools.count"] = None):
+        self.id = mock.get("id") or 0
+        params = _pairs(mock.get("params"))
+        repeated = {key for key, count in Counter(key for key, _ in params).items() if count > 1}
+        self.params = tuple((k, v) for k, v in params if k not in repeated)
+        # Keys given more than once must match the request's values in order
+        self.multi_params = tuple((key, [v for k, v in params if k == key]) for key in sorted(repeated))
+        self.headers = _pairs(mock.get("headers"), lower=True)
+        body = mock.get("body")
+        self.body_digest = body_digest(body) if body else None
+        try:
+            self.body_match: Optional[BodyMatcher] = compile_body_match(mock.get("body_match"))
+        except ValueError:
+            self.body_match = None
+        self.status = mock.get("response_status") or 200
+        self.response_headers = {k: v for k, v in _pairs(mock.get("response_headers"))}
+        self.response_body = (mock.get("response_body") or "").encode("utf-8")
+        # Static responses (recorded upstream replies) are never parsed as templates
+        make_template = static_template if mock.get("static_response") else _template
+        template = make_template(mock.get("response_body") or "")
+        self.body_template = None if template.is_static else template
+        self.header_templates = {
+            k: template for k, v in self.response_headers.items()
+            if isinstance(v, str) and not (template := make_template(v)).is_static
+        }
+        self.needs_body = any(
+            t.needs_body for t in itertools.chain([self.body_template] if self.body_template else [], self.header_templates.values())
+        )
+        self.counter = counter or itertools.count(1)
+        self.delay_ms = mock.get("delay_ms") or 0
+        try:
+            self.latency = compile_latency(mock.get("latency_profile"))
+        except ValueError:
+            self.latency = None
+        self.bandwidth_kbps = mock.get("bandwidth_kbps") or 0
+        try:
+            self.faults = compile_faults(mock.get("faults"))
+        except ValueError:
+            self.faults = ()
+        try:
+            self.body_file = body_file_path(mock["body_file"]) if mock.get("body_file") else None
+        except ValueError:
+            self.body_file = None
+        self.definition = mock
+
+    def sample_delay(self) -> float:
+        """Delay in ms for one response: a latency profile sample, else ``delay_ms``."""
+        if self.latency is not None:
+            return self.latency()
+        return self.delay_ms
+
+    def render(self, ctx: RequestContext) -> Tuple[bytes, Dict[str, str]]:
+        """Response body and headers rendered for one request."""
+        body = self.response_body
+        if self.body_template is not None:
+            body = self.body_template.render(ctx).encode("utf-8")
+        headers = self.response_headers
+        if self.header_templates:
+            headers = dict(headers)
+            for key, template in self.header_templates.items():
+                headers[key] = template.render(ctx)
+        return body, headers
+
+    def matches(self, query: Mapping[str, str], headers: Mapping[str, str]) -> bool:
+        for key, value in self.params:
+            if query.get(key) != value:
+                return False
+        for key, values in self.multi_params:
+            if query.getlist(key) != values:
+                return False
+        for key, value in self.headers:
+            if headers.get(key) != value:
+                return False
+        return True
+
+
+class Route:
+    """
+    All mocks registered for one (method, path), split by body matcher.
+
+    Exact-body mocks are keyed by body digest. Mocks with a ``body_match`` are
+    bucketed by the value they require at a discriminator path -- the JSON path
+    most of them compare with ``==`` (e.g. ``$.type``) -- so a request is only
+    checked against the bucket for its own value plus the few mocks that do
+    not constrain that path.
+    """
+
+    __slots__ = ("by_body", "any_body", "by_match", "discriminator", "match_buckets", "match_rest")
+
+    def __init__(self):
+        self.by_body: Dict[bytes, List[CompiledMock]] = {}
+        self.any_body: List[CompiledMock] = []
+        self.by_match: List[CompiledMock] = []
+        self.discriminator: Optional[tuple] = None
+        self.match_buckets: Dict[str, List[CompiledMock]] = {}
+        self.match_rest: List[CompiledMock] = []
+
+    def add(self, mock: CompiledMock) -> None:
+        if mock.body_match is not None:
+            self.by_match.append(mock)
+        elif mock.body_digest is None:
+            self.any_body.append(mock)
+        else:
+            self.by_body.setdefault(mock.body_digest, []).append(mock)
+
+    def finalize(self) -> None:
+        """Pick the discriminator path and bucket body-matched mocks by its value."""
+        paths = Counter(path for mock in self.by_match for path in {steps for steps, _ in mock.body_match.equalities})
+        self.discriminator = None
+        self.match_buckets, self.match_rest = {}, list(self.by_match)
+        if not paths:
+            return
+        path, count = paths.most_common(1)[0]
+        if count < 2:
+            return
+        self.discriminator, self.match_rest = path, []
+        for mock in self.by_match:
+            values = {value for steps, value in mock.body_match.equalities if steps == path}
+            if len(values) == 1:
+                self.match_buckets.setdefault(values.pop(), []).append(mock)
+            elif values:
+                # Contradictory equalities: the mock can never match.
+                continue
+            else:
+                self.match_rest.append(mock)
+
+    @property
+    def needs_body(self) -> bool:
+        return bool(self.by_body or self.by_match)
+
+    def _match_candidates(self, body: ParsedBody) -> Iterator[CompiledMock]:
+        if self.discriminator is None:
+            return iter(self.match_rest)
+        values = select_values(body.value, self.discriminator) if self.match_buckets else []
+        bucket = self.match_buckets.get(canonical(values[0]), ()) if values else ()
+        return heapq.merge(bucket, self.match_rest, key=lambda m: m.id)
+
+    def select(self, query: Mapping[str, str], headers: Mapping[str, str], body: Optional[ParsedBody]) -> Optional[CompiledMock]:
+        """
+        Return the lowest-id mock whose params, headers and body rule match.
+
+        Body-specific mocks are found with one dict lookup on the request body
+        digest; only mocks with the same body (or no body rule) are examined.
+        ``body_match`` mocks are narrowed to one discriminator bucket the same
+        way and the request body is parsed at most once for all of them.
+        """
+        candidates = []
+        if self.by_body and body is not None:
+            for mock in self.by_body.get(body_digest(body.text), ()):
+                if mock.matches(query, headers):
+                    candidates.append(mock)
+                    break
+        if self.by_match and body is not None:
+            for mock in self._match_candidates(body):
+                if mock.matches(query, headers) and mock.body_match.matches(body):
+                    candidates.append(mock)
+                    break
+        for mock in self.any_body:
+            if mock.matches(query, headers):
+                candidates.append(mock)
+                break
+        if not candidates:
+            return None
+        return min(candidates, key=lambda m: m.id)
+
+
+class _Node:
+    """Segment trie node; children are tried from most to least specific."""
+
+    __slots__ = ("static", "patterns", "param", "star", "rest", "routes")
+
+    def __init__(self):
+        self.static: Dict[str, "_Node"] = {}
+        self.patterns: List[Tuple[re.Pattern, "_Node"]] = []
+        self.param: Optional[_Node] = None
+        self.star: Optional[_Node] = None
+        self.rest: Optional[_Node] = None
+        # (route, capture names) for every template ending at this node
+        self.routes: List[Tuple[Route, tuple]] = []
+
+    def insert(self, path: str, route: Route) -> None:
+        node, names = self, []
+        for seg in _segments(path):
+            kind, value = _compile_segment(seg)
+            if kind == "static":
+                node = node.static.setdefault(value, _Node())
+                continue
+            if kind == "pattern":
+                child = next((n for rx, n in node.patterns if rx.pattern == value.pattern), None)
+                if child is None:
+                    child = _Node()
+                    node.patterns.append((value, child))
+                node, value = child, None
+            elif kind == "param":
+                node.param = node.param or _Node()
+                node = node.param
+            elif kind == "star":
+                node.star = node.star or _Node()
+                node = node.star
+            else:
+                node.rest = node.rest or _Node()
+                node = node.rest
+            names.append(value)
+        node.routes.append((route, tuple(names)))
+
+    def walk(self, segs: List[str], i: int, caps: list) -> Iterator[Tuple[Route, Dict[str, str]]]:
+        if i == len(segs):
+            for route, names in self.routes:
+                yield route, _captures(names, caps)
+            if self.rest is not None:
+                yield from self.rest.walk(segs, i, caps + [""])
+            return
+        seg = segs[i]
+        child = self.static.get(seg)
+        if child is not None:
+            yield from child.walk(segs, i + 1, caps)
+        for rx, child in self.patterns:
+            m = rx.fullmatch(seg)
+            if m:
+                yield from child.walk(segs, i + 1, caps + [m.groupdict()])
+        if self.param is not None and seg:
+            yield from self.param.walk(segs, i + 1, caps + [seg])
+        if self.star is not None:
+            yield from self.star.walk(segs, i + 1, caps + [seg])
+        if self.rest is not None:
+            for j in range(len(segs), i - 1, -1):
+                yield from self.rest.walk(segs, j, caps + ["/".join(segs[i:j])])
+
+
+def _captures(names: tuple, caps: list) -> Dict[str, str]:
+    params: Dict[str, str] = {}
+    for name, cap in zip(names, caps):
+        if name is None:
+            params.update(cap)
+        else:
+            params[name] = cap
+    return params
+
+
+class MockIndex:
+    """
+    Routing table for the mock catch-all route.
+
+    Exact paths live in a dict keyed by (METHOD, path). Templates (``{param}``,
+    ``*``, ``**``) are compiled into a per-method segment trie, and paths that
+    start with ``^`` are full-match regexes whose named groups become path
+    params. Lookup yields candidates from most to least specific: exact, then
+    trie matches (static > pattern > ``{param}`` > ``*`` > ``**`` at each
+    segment), then regexes in save order.
+
+    The table is rebuilt from the full mock list and swapped in with a single
+    assignment, so requests always see either the old or the new table.
+    """
+
+    def __init__(self):
+        self._tables: tuple = ({}, {}, {})
+        self._counters: Dict[int, "itertools.count"] = {}
+        self.size = 0
+        # mocks_revision the table was built from; set by the loader.
+        self.revision = 0
+
+    def rebuild(self, mocks: List[Dict[str, Any]]) -> None:
+        routes: Dict[tuple, Route] = {}
+        counters: Dict[int, "itertools.count"] = {}
+        for mock in sorted(mocks, key=lambda m: m.get("id") or 0):
+            key = ((mock.get("method") or "GET").upper(), mock.get("path") or "")
+            # {{counter}} keeps counting across reloads
+            compiled = CompiledMock(mock, self._counters.get(mock.get("id")))
+            counters[compiled.id] = compiled.counter
+            routes.setdefault(key, Route()).add(compiled)
+
+        exact: Dict[tuple, Route] = {}
+        tries: Dict[str, _Node] = {}
+        regexes: Dict[str, List[Tuple[re.Pattern, Route]]] = {}
+        for (method, path), route in routes.items():
+            route.finalize()
+            try:
+                kind = path_kind(path)
+                if kind == "exact":
+                    exact[(method, path)] = route
+                elif kind == "template":
+                    tries.setdefault(method, _Node()).insert(path, route)
+                else:
+                    regexes.setdefault(method, []).append((re.compile(path), route))
+            except re.error:
+                # Saved before validation existed; such a mock can never match.
+                continue
+        self._tables = (exact, tries, regexes)
+        self._counters = counters
+        self.size = len(mocks)
+
+    def lookup(self, method: str, path: str) -> Iterator[Tuple[Route, Dict[str, str]]]:
+        """Yield ``(route, path_params)`` candidates, most specific first."""
+        exact, tries, regexes = self._tables
+        method = method.upper()
+        route = exact.get((method, path))
+        if route is not None:
+            yield route, {}
+        trie = tries.get(method)
+        if trie is not None:
+            yield from trie.walk(_segments(path), 0, [])
+        for rx, route in regexes.get(method, ()):
+            m = rx.fullmatch(path)
+            if m:
+                yield route, {k: v for k, v in m.groupdict().items() if v is not None}
+
+
+mock_index = MockIndex()
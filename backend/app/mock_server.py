@@ -0,0 +1,433 @@
+"""
+Mock serving, shared by the platform API and a standalone mock server.
+
+The platform API keeps answering mocks through its catch-all route, but load
+tests should point at the standalone app instead so mock traffic does not go
+through the API's logging middleware or compete with the management UI::
+
+    cd backend
+    uvicorn app.mock_server:mock_app --port 8001 --workers 4
+
+Every worker loads the mocks from the shared SQLite database and polls the
+``mocks_revision`` counter (see ``database._migration_4_mock_revision``) to
+hot-reload definitions saved through the platform API. Requests are written
+to their own access log, counted in per-process metrics exposed at
+``/__mock/metrics`` and kept in a bounded journal (``/__mock/journal``, see
+``mock_journal``). Unmatched requests can be forwarded to an upstream and
+recorded as new mocks (``/__mock/proxy``, see ``mock_proxy``).
+"""
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from .database import init_db, open_pool, close_pool, DATA_DIR
+from .storage import get_all_mocks, get_mocks_revision
+from .mock_router import mock_index
+from .mock_template import RequestContext
+from .mock_match import ParsedBody
+from .mock_shaping import throttled
+from .mock_faults import fault_injector, InjectedDisconnect
+from .mock_files import file_response
+from .mock_proxy import mock_proxy
+from .log_sink import LogSink
+from .metrics import registry, mock_match_duration, counter, gauge, CONTENT_TYPE
+from .mock_journal import mock_journal, journal_digest, journal_writer, flush_journal, MOCK_JOURNAL_PERSIST
+
+MOCK_ACCESS_LOG_FILE = os.path.join(DATA_DIR, "mock_access_log.txt")
+# Seconds between checks of the mocks revision; 0 disables hot reload.
+MOCK_RELOAD_INTERVAL = float(os.getenv("MOCK_RELOAD_INTERVAL", "1.0"))
+# Number of recent requests whose latency feeds the reported percentiles.
+MOCK_METRICS_WINDOW = int(os.getenv("MOCK_METRICS_WINDOW", "2048"))
+# Largest request body read only to digest it for the journal.
+MOCK_JOURNAL_MAX_BODY = int(os.getenv("MOCK_JOURNAL_MAX_BODY", "65536"))
+# Scope key under which DropConnections stores the connection's abort function.
+ABORT_CONNECTION = "mock.abort_connection"
+
+
+class MockMetrics:
+    """Per-process counters for served mock requests."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.matched = 0
+        self.unmatched = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.statuses: Counter = Counter()
+        self.mocks: Counter = Counter()
+        self.reloads = 0
+        # Latencies of the most recent requests, for percentiles.
+        self.recent: deque = deque(maxlen=MOCK_METRICS_WINDOW)
+
+    def record(self, status: int, mock_id: Optional[int], latency_ms: float) -> None:
+        self.requests += 1
+        if mock_id is None:
+            self.unmatched += 1
+        else:
+            self.matched += 1
+            self.mocks[mock_id] += 1
+        self.statuses[status] += 1
+        self.latency_ms_total += latency_ms
+        if latency_ms > self.latency_ms_max:
+            self.latency_ms_max = latency_ms
+        self.recent.append(latency_ms)
+
+    def percentiles(self) -> dict:
+        if not self.recent:
+            return {}
+        ordered = sorted(self.recent)
+        last = len(ordered) - 1
+        return {f"p{p}": round(ordered[min(last, int(p / 100 * len(ordered)))], 3) for p in (50, 90, 99)}
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "matched": self.matched,
+            "unmatched": self.unmatched,
+            "latency_ms_avg": round(self.latency_ms_total / self.requests, 3) if self.requests else 0.0,
+            "latency_ms_max": round(self.latency_ms_max, 3),
+            "latency_ms_recent": self.percentiles(),
+            "statuses": {str(k): v for k, v in self.statuses.items()},
+            "top_mocks": [{"id": k, "hits": v} for k, v in self.mocks.most_common(20)],
+            "mocks_loaded": mock_index.size,
+            "mocks_revision": mock_index.revision,
+            "reloads": self.reloads,
+            "faults": fault_injector.stats(),
+        }
+
+
+mock_metrics = MockMetrics()
+
+
+@registry.collector
+def _mock_families():
+    m = mock_metrics
+    yield counter("mock_requests_total", "Mock requests by outcome.", [({"result": "matched"}, m.matched), ({"result": "unmatched"}, m.unmatched)])
+    yield counter("mock_responses_total", "Mock responses by status code.", [({"status": k}, v) for k, v in sorted(m.statuses.items())])
+    yield counter("mock_faults_injected_total", "Faults injected into mock responses.", [({"type": k}, v) for k, v in sorted(fault_injector.injected.items())])
+    yield counter("mock_fault_disconnects_total", "Mock response streams cut by drop faults.", [({}, fault_injector.disconnects)])
+    yield counter("mock_proxy_forwarded_total", "Unmatched mock requests forwarded upstream.", [({}, mock_proxy.forwarded)])
+    yield counter("mock_reloads_total", "Mock routing table rebuilds.", [({}, m.reloads)])
+    yield gauge("mocks_loaded", "Mocks in the routing table.", [({}, mock_index.size)])
+
+_reload_lock = asyncio.Lock()
+
+async def reload_mock_index() -> None:
+    """
+    Recompile the in-memory mock routing table from the database.
+
+    Reloads are serialised so a slow reload cannot swap in a table that is
+    older than one built by a later save. The revision is read before the
+    mocks, so a change racing with the reload triggers another one.
+    """
+    async with _reload_lock:
+        revision = await get_mocks_revision()
+        mock_index.rebuild(await get_all_mocks())
+        mock_index.revision = revision
+        mock_metrics.reloads += 1
+
+
+def configure_faults(payload: dict) -> dict:
+    """
+    Apply ``{"rules": [...], "seed": N}`` to the global fault injector.
+
+    Omitted keys are left unchanged; passing ``"seed": null`` reseeds randomly.
+    """
+    try:
+        fault_injector.configure(payload.get("rules"), payload.get("seed"), reseed="seed" in payload)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return fault_injector.stats()
+
+
+async def _read_body(request: Request) -> str:
+    try:
+        request_body_bytes = await request.body()
+        return request_body_bytes.decode('utf-8')
+    except Exception:
+        return ""
+
+
+async def serve_mock(request: Request, request_path: str) -> Response:
+    """Answer a request from the matching mock, or 404 if none matches."""
+    started = time.perf_counter()
+    request_method = request.method
+    # Only read the body when some candidate mock matches on it or echoes it
+    request_body_str = None
+    # Parsed at most once and shared by body matchers and templates
+    parsed_body = None
+    for route, path_params in mock_index.lookup(request_method, request_path):
+        if route.needs_body and request_body_str is None:
+            request_body_str = await _read_body(request)
+            parsed_body = ParsedBody(request_body_str)
+
+        mock = route.select(request.query_params, request.headers, parsed_body)
+        if mock is None:
+            continue
+        mock_match_duration.observe(("matched",), time.perf_counter() - started)
+        if mock.needs_body and request_body_str is None:
+            request_body_str = await _read_body(request)
+            parsed_body = ParsedBody(request_body_str)
+        ctx = RequestContext(
+            request_method, request_path, path_params, request.query_params, request.headers,
+            request_body_str, mock.counter, parsed_body,
+        )
+        body, headers = mock.render(ctx)
+
+        # Apply delay (sampled from the mock's latency profile if it has one)
+        delay_ms = mock.sample_delay()
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000.0)
+
+        fault = fault_injector.pick(mock.faults, mock.id, request_method, request_path)
+        if mock.body_file and (fault is None or fault.type in ("truncate", "malformed", "drop")):
+            return await _serve_file(request, request_path, request_body_str, mock, headers, fault, started)
+        if fault is not None:
+            response = await fault_injector.apply(fault, body, mock.status, headers)
+            if fault.type == "drop":
+                response = _dropping(request, response)
+            _record(request, request_path, await _journal_body(request, request_body_str), mock.id, response.status_code, started)
+            return response
+
+        if mock.bandwidth_kbps:
+            # Latency is recorded when the throttled body has been sent.
+            request_body_str = await _journal_body(request, request_body_str)
+            done = lambda: _record(request, request_path, request_body_str, mock.id, mock.status, started)
+            return StreamingResponse(
+                throttled(body, mock.bandwidth_kbps, on_done=done),
+                status_code=mock.status,
+                headers=headers
+            )
+
+        _record(request, request_path, await _journal_body(request, request_body_str), mock.id, mock.status, started)
+        return Response(
+            content=body,
+            status_code=mock.status,
+            headers=headers
+        )
+
+    mock_match_duration.observe(("unmatched",), time.perf_counter() - started)
+    if mock_proxy.enabled:
+        request_body_bytes = await request.body()
+        response = await mock_proxy.forward(request, request_path, request_body_bytes)
+        _record(request, request_path, request_body_bytes.decode('utf-8', 'replace'), None, response.status_code, started)
+        return response
+
+    # If no mock was matched, return a default 404
+    _record(request, request_path, await _journal_body(request, request_body_str), None, 404, started)
+    return Response(content=f"No mock found for {request_method} {request_path}", status_code=404)
+
+
+async def _serve_file(request: Request, request_path: str, request_body_str: Optional[str], mock, headers: dict, fault, started: float) -> Response:
+    """Stream a mock's body file; body-mangling faults cut or abort the stream."""
+    request_body_str = await _journal_body(request, request_body_str)
+    try:
+        size = os.path.getsize(mock.body_file)
+    except OSError:
+        _record(request, request_path, request_body_str, mock.id, 500, started)
+        return Response(content=f"Mock body file is missing for mock {mock.id}", status_code=500)
+    limit, error = None, None
+    if fault is not None and fault.type == "truncate":
+        limit = int(size * fault.fraction)
+    elif fault is not None and fault.type == "malformed":
+        limit = fault_injector.rng.randrange(size) if size else 0
+    elif fault is not None:
+        limit, error = fault.after_bytes, InjectedDisconnect("connection dropped by fault injection")
+    response = file_response(
+        mock.body_file, request.method, mock.status, headers,
+        range_header=request.headers.get("range"), kbps=mock.bandwidth_kbps, limit=limit, error=error,
+        on_done=lambda status: _record(request, request_path, request_body_str, mock.id, status, started),
+    )
+    return _dropping(request, response) if error is not None else response
+
+
+class DropConnections:
+    """
+    ASGI middleware that lets drop faults reset the client's connection.
+
+    uvicorn passes a ``receive`` bound to the connection, whose transport is
+    stored in the scope as an abort function. Middleware further in replace
+    ``receive``, so this has to wrap all of them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        transport = getattr(getattr(receive, "__self__", None), "transport", None)
+        if scope["type"] == "http" and transport is not None:
+            scope[ABORT_CONNECTION] = transport.abort
+        await self.app(scope, receive, send)
+
+
+def _dropping(request: Request, response: Response) -> Response:
+    """Make a drop fault's ``InjectedDisconnect`` abort the connection mid-body."""
+    if isinstance(response, StreamingResponse):
+        response.body_iterator = _until_disconnect(response.body_iterator, request.scope.get(ABORT_CONNECTION))
+    return response
+
+
+async def _until_disconnect(chunks: AsyncIterator[bytes], abort: Optional[Callable[[], None]]) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except InjectedDisconnect:
+        fault_injector.disconnects += 1
+        if abort is None:
+            # No transport to abort; the server resets the connection on the error
+            raise
+        abort()
+        # Once the server has seen the connection lost it discards the rest of the response
+        await asyncio.sleep(0)
+
+
+async def _journal_body(request: Request, body: Optional[str]) -> Optional[str]:
+    """The request body for the journal digest, reading small bodies that matching did not need."""
+    if body is not None or mock_journal.entries.maxlen == 0:
+        return body
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and 0 < int(length) <= MOCK_JOURNAL_MAX_BODY:
+        return await _read_body(request)
+    return None
+
+
+def _record(request: Request, request_path: str, body: Optional[str], mock_id: Optional[int], status: int, started: float) -> None:
+    """Count the request in the metrics and the journal with the latency the client saw."""
+    latency_ms = (time.perf_counter() - started) * 1000
+    mock_metrics.record(status, mock_id, latency_ms)
+    if mock_journal.entries.maxlen == 0:
+        return
+    mock_journal.record(
+        request.method, request_path, request.url.query, dict(request.headers),
+        journal_digest(body), mock_id, status, round(latency_ms, 3),
+    )
+
+
+# ---------- Standalone mock app ----------
+mock_app = FastAPI(title="Test Platform Mock Server", docs_url=None, redoc_url=None, openapi_url=None)
+mock_app.add_middleware(DropConnections)
+
+_watch_task: Optional[asyncio.Task] = None
+_journal_task: Optional[asyncio.Task] = None
+access_log = LogSink(MOCK_ACCESS_LOG_FILE)
+
+
+def start_journal_writer() -> Optional[asyncio.Task]:
+    """Start the journal's write-behind task when persistence is enabled."""
+    if not MOCK_JOURNAL_PERSIST:
+        return None
+    return asyncio.create_task(journal_writer())
+
+
+async def stop_journal_writer(task: Optional[asyncio.Task]) -> None:
+    """Stop the write-behind task and persist whatever it has not written yet."""
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await flush_journal()
+    except Exception as e:
+        print(f"[mock-journal] final flush failed: {e}")
+
+async def _watch_mocks() -> None:
+    """Poll the mocks revision and reload the index when it changes."""
+    while True:
+        await asyncio.sleep(MOCK_RELOAD_INTERVAL)
+        try:
+            if await get_mocks_revision() != mock_index.revision:
+                await reload_mock_index()
+        except Exception as e:
+            print(f"[mock-server] reload failed: {e}")
+
+@mock_app.on_event("startup")
+async def _mock_startup():
+    global _watch_task, _journal_task
+    await init_db()
+    await open_pool()
+    await reload_mock_index()
+    access_log.start()
+    if MOCK_RELOAD_INTERVAL > 0:
+        _watch_task = asyncio.create_task(_watch_mocks())
+    _journal_task = start_journal_writer()
+    await mock_proxy.start(on_saved=reload_mock_index)
+
+@mock_app.on_event("shutdown")
+async def _mock_shutdown():
+    global _watch_task, _journal_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        _watch_task = None
+    await mock_proxy.stop()
+    await stop_journal_writer(_journal_task)
+    _journal_task = None
+    await close_pool()
+    await access_log.stop()
+
+@mock_app.get("/__mock/metrics", include_in_schema=False)
+async def _mock_metrics():
+    return {**mock_metrics.stats(), "access_log": access_log.stats()}
+
+@mock_app.get("/__mock/metrics/prometheus", include_in_schema=False)
+async def _mock_prometheus():
+    # Not /metrics: the catch-all must stay free for mocks on any path.
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@mock_app.get("/__mock/journal", include_in_schema=False)
+async def _mock_journal(
+    method: Optional[str] = None,
+    path: Optional[str] = None,
+    mock_id: Optional[int] = None,
+    matched: Optional[bool] = None,
+    status: Optional[int] = None,
+    since: Optional[float] = None,
+    limit: int = 100,
+):
+    limit = max(1, min(limit, 1000))
+    return {
+        "stats": mock_journal.stats(),
+        "items": mock_journal.query(method, path, mock_id, matched, status, since, limit),
+    }
+
+@mock_app.get("/__mock/proxy", include_in_schema=False)
+async def _mock_proxy_status():
+    return mock_proxy.stats()
+
+@mock_app.put("/__mock/proxy", include_in_schema=False)
+async def _mock_proxy_configure(upstream: Optional[str] = None, mode: Optional[str] = None):
+    try:
+        mock_proxy.configure(upstream, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return mock_proxy.stats()
+
+@mock_app.get("/__mock/faults", include_in_schema=False)
+async def _mock_faults_status():
+    return fault_injector.stats()
+
+@mock_app.put("/__mock/faults", include_in_schema=False)
+async def _mock_faults_configure(payload: dict):
+    return configure_faults(payload)
+
+@mock_app.post("/__mock/reload", include_in_schema=False)
+async def _mock_reload():
+    await reload_mock_index()
+    return {"ok": True, "revision": mock_index.revision, "mocks": mock_index.size}
+
+@mock_app.api_route("/{full_path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"], include_in_schema=False)
+async def _mock_route(request: Request, full_path: str):
+    started = time.perf_counter()
+    response = await serve_mock(request, f"/{full_path}")
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    client = request.client.host if request.client else "-"
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    access_log.write(f"{timestamp} - {client} - \"{request.method} /{full_path}\" - {response.status_code} - {elapsed_ms:.1f}ms")
+    return response
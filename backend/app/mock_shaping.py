@@ -0,0 +1,167 @@
+"""
+Latency and bandwidth shaping for mock responses.
+
+A mock's ``latency`` profile replaces its fixed ``delay_ms`` with a sampled
+delay in milliseconds::
+
+    {"type": "fixed", "ms": 120}
+    {"type": "normal", "mean": 100, "stddev": 20}
+    {"type": "lognormal", "median": 80, "sigma": 0.6}
+    {"type": "pareto", "scale": 50, "alpha": 1.5}
+    {"type": "percentiles", "p50": 80, "p90": 200, "p99": 900, "p100": 3000}
+
+Every profile also accepts ``min`` and ``max`` (ms) to clamp samples.
+Percentile tables are sampled by interpolating linearly between the given
+points; ``p0`` defaults to the lowest given value.
+
+``bandwidth_kbps`` caps the response body at N KiB/s by streaming it in
+chunks paced against the wall clock.
+
+Profiles are validated and compiled into sampler functions when a mock is
+saved or loaded, so serving a request only draws one random number.
+"""
+import asyncio
+import math
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+# Random source for latency samples; seeded through ``seed_latency``.
+_rng = random.Random()
+
+LATENCY_TYPES = ("fixed", "normal", "lognormal", "pareto", "percentiles")
+# Pacing granularity for bandwidth caps.
+_TICK_S = 0.05
+_MAX_CHUNK = 64 * 1024
+
+
+def seed_latency(seed: Optional[int]) -> None:
+    _rng.seed(seed)
+
+
+def _number(spec: Dict[str, Any], key: str, default: Optional[float] = None, positive: bool = False) -> float:
+    value = spec.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"latency.{key} must be a number")
+    if value < 0 or (positive and value == 0):
+        raise ValueError(f"latency.{key} must be {'positive' if positive else 'non-negative'}")
+    return float(value)
+
+
+def _percentile_sampler(spec: Dict[str, Any]) -> Callable[[], float]:
+    points = []
+    for key, value in spec.items():
+        if key.startswith("p") and key[1:].replace(".", "", 1).isdigit():
+            pct = float(key[1:])
+            if not 0 <= pct <= 100:
+                raise ValueError(f"latency.{key} is not a percentile")
+            points.append((pct / 100, _number(spec, key)))
+    if not points:
+        raise ValueError("latency percentiles need at least one pNN entry")
+    points.sort()
+    if points[0][0] > 0:
+        points.insert(0, (0.0, points[0][1]))
+    if points[-1][0] < 1:
+        points.append((1.0, points[-1][1]))
+    for (_, a), (_, b) in zip(points, points[1:]):
+        if b < a:
+            raise ValueError("latency percentiles must not decrease")
+
+    def sample() -> float:
+        u = _rng.random()
+        for (q0, v0), (q1, v1) in zip(points, points[1:]):
+            if u <= q1:
+                return v0 if q1 == q0 else v0 + (v1 - v0) * (u - q0) / (q1 - q0)
+        return points[-1][1]
+
+    return sample
+
+
+def compile_latency(spec: Optional[Dict[str, Any]]) -> Optional[Callable[[], float]]:
+    """
+    Turn a latency profile into a function returning a delay in ms.
+
+    Returns None when ``spec`` is empty and raises ``ValueError`` when it is
+    not a valid profile.
+    """
+    if not spec:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("latency must be an object")
+    kind = spec.get("type")
+    if kind == "fixed":
+        ms = _number(spec, "ms")
+        sample = lambda: ms
+    elif kind == "normal":
+        mean, stddev = _number(spec, "mean"), _number(spec, "stddev", 0)
+        sample = lambda: _rng.gauss(mean, stddev)
+    elif kind == "lognormal":
+        mu, sigma = math.log(_number(spec, "median", positive=True)), _number(spec, "sigma", 0.5)
+        sample = lambda: _rng.lognormvariate(mu, sigma)
+    elif kind == "pareto":
+        scale, alpha = _number(spec, "scale", positive=True), _number(spec, "alpha", positive=True)
+        sample = lambda: scale * _rng.paretovariate(alpha)
+    elif kind == "percentiles":
+        sample = _percentile_sampler(spec)
+    else:
+        raise ValueError(f"latency.type must be one of {', '.join(LATENCY_TYPES)}")
+
+    low = _number(spec, "min", 0)
+    high = _number(spec, "max") if "max" in spec else math.inf
+    if high < low:
+        raise ValueError("latency.max must not be below latency.min")
+    return lambda: min(max(sample(), low), high)
+
+
+def validate_bandwidth(kbps: Optional[int]) -> None:
+    if kbps is not None and (isinstance(kbps, bool) or not isinstance(kbps, int) or kbps < 0):
+        raise ValueError("bandwidth_kbps must be a non-negative integer")
+
+
+async def throttled(body: bytes, kbps: int, on_done: Optional[Callable[[], Any]] = None) -> AsyncIterator[bytes]:
+    """
+    Yield ``body`` at about ``kbps`` KiB/s.
+
+    Chunks cover one pacing tick each, and the sleep before each chunk is
+    computed from the bytes already sent, so rounding errors do not add up.
+    ``on_done`` runs when the stream ends, even if the client disconnects.
+    """
+    rate = kbps * 1024
+    chunk = max(1, min(_MAX_CHUNK, int(rate * _TICK_S)))
+    started = time.perf_counter()
+    try:
+        for offset in range(0, len(body), chunk):
+            wait = offset / rate - (time.perf_counter() - started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield body[offset:offset + chunk]
+        wait = len(body) / rate - (time.perf_counter() - started)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    finally:
+        if on_done is not None:
+            on_done()
+
+
+async def paced(chunks: AsyncIterator[Any], kbps: int) -> AsyncIterator[Any]:
+    """
+    Re-emit an async stream of bytes-like chunks at about ``kbps`` KiB/s.
+
+    Large chunks are split into pacing-tick sized slices (cheap for
+    memoryviews), so a capped file stream does not burst a whole read chunk.
+    """
+    rate = kbps * 1024
+    tick = max(1, min(_MAX_CHUNK, int(rate * _TICK_S)))
+    started = time.perf_counter()
+    sent = 0
+    async for chunk in chunks:
+        for offset in range(0, len(chunk), tick):
+            wait = sent / rate - (time.perf_counter() - started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            piece = chunk[offset:offset + tick]
+            sent += len(piece)
+            yield piece
+    wait = sent / rate - (time.perf_counter() - started)
+    if wait > 0:
+        await asyncio.sleep(wait)
@@ -1,7 +1,10 @@
 import json
-from typing import Optional, List, Dict, Any
+import os
+from typing import Optional, List, Dict, Any, AsyncIterator, Sequence
 
-from .database import get_db_connection
+from . import database
+from .cache import query_cache
+from .database import db_connection, table_schema, SEARCH_COLUMNS, PROJECT_CHILD_TABLES
 
 # Helper to convert Row objects to dictionaries
 def _row_to_dict(row: Any) -> Dict[str, Any]:
@@ -10,128 +13,310 @@ def _row_to_dict(row: Any) -> Dict[str, Any]:
 def _rows_to_dicts(rows: List[Any]) -> List[Dict[str, Any]]:
     return [dict(row) for row in rows]
 
-# ---- Generic Case Management ----
-async def list_cases(table_name: str, project_id: int, keyword: str | None = None, filters: dict | None = None) -> list:
-    conn = await get_db_connection()
-    query = f"SELECT * FROM {table_name} WHERE project_id = ?"
-    params = [project_id]
+def _filters_key(filters: dict | None) -> tuple:
+    """Hashable, order-independent form of a ``{field: set(values)}`` filter dict."""
+    if not filters:
+        return ()
+    return tuple(sorted((field, tuple(sorted(values))) for field, values in filters.items() if values))
 
-    if keyword:
-        kw = f"%{keyword.lower()}%"
-        query += " AND (LOWER(test_feature) LIKE ? OR LOWER(description) LIKE ?)"
-        params.extend([kw, kw])
+def _invalidate_project(project_id: int) -> None:
+    for table in PROJECT_CHILD_TABLES:
+        query_cache.bump(table, project_id)
+    query_cache.bump("projects")
+
+# ---- Generic Case Management ----
+def _split_search_terms(keyword: str) -> tuple[list, list]:
+    """
+    Split a search box string into ``(fts_terms, like_terms)``.
+
+    Every whitespace-separated term must match. With the trigram tokenizer any
+    substring of three or more characters is answered by the full-text index;
+    shorter terms (common for two-character Chinese words) need LIKE. With
+    unicode61 every term becomes a prefix query. Without FTS5 everything is LIKE.
+    """
+    tokenizer = database.FTS_TOKENIZER
+    terms = keyword.split()
+    if not tokenizer:
+        return [], terms
+    if tokenizer == "trigram":
+        return [t for t in terms if len(t) >= 3], [t for t in terms if len(t) < 3]
+    return terms, []
+
+def _fts_query(terms: list) -> str:
+    suffix = "*" if database.FTS_TOKENIZER == "unicode61" else ""
+    return " AND ".join('"' + t.replace('"', '""') + '"' + suffix for t in terms)
+
+def _search_source(table_name: str, keyword: str | None) -> tuple[str, str, list, bool]:
+    """
+    Return ``(from_clause, where, params, ranked)`` for an optional keyword search.
+
+    Full-text matches join the ``<table>_fts`` index and can be ordered by bm25;
+    terms the index cannot answer are filtered with LIKE over the same columns.
+    """
+    source = f"{table_name} AS t"
+    where, params, ranked = "1=1", [], False
+    if not keyword or not keyword.split():
+        return source, where, params, ranked
+    fts_terms, like_terms = _split_search_terms(keyword)
+    if fts_terms:
+        fts = f"{table_name}_fts"
+        source += f" JOIN {fts} ON {fts}.rowid = t.id"
+        where += f" AND {fts} MATCH ?"
+        params.append(_fts_query(fts_terms))
+        ranked = True
+    columns = SEARCH_COLUMNS[table_name]
+    for term in like_terms:
+        where += " AND (" + " OR ".join(f"LOWER(t.{c}) LIKE ?" for c in columns) + ")"
+        params.extend([f"%{term.lower()}%"] * len(columns))
+    return source, where, params, ranked
+
+def _case_conditions(table_name: str, project_id: int, keyword: str | None, filters: dict | None) -> tuple[str, str, list, bool]:
+    """Build the shared FROM/WHERE clauses used by ``list_cases`` and ``count_cases``."""
+    source, where, params, ranked = _search_source(table_name, keyword)
+    where += " AND t.project_id = ?"
+    params.append(project_id)
 
     if filters:
         for field, allowed_values in filters.items():
             if allowed_values and (field in ['action', 'result', 'method']):
                 placeholders = ','.join('?' for _ in allowed_values)
-                query += f" AND {field} IN ({placeholders})"
+                where += f" AND t.{field} IN ({placeholders})"
                 params.extend(list(allowed_values))
-
-    cursor = await conn.execute(query, params)
-    rows = await cursor.fetchall()
-    await conn.close()
-    return _rows_to_dicts(rows)
+    return source, where, params, ranked
+
+async def list_cases(
+    table_name: str,
+    project_id: int,
+    keyword: str | None = None,
+    filters: dict | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+    after_id: int | None = None,
+    use_cache: bool = True,
+) -> list:
+    """
+    Return cases for a project ordered by id, or by relevance for keyword searches.
+
+    ``limit``/``offset`` page through the result in SQL. ``after_id`` is a keyset
+    cursor: only rows with a larger id are returned, so deep pages cost the same
+    as the first one. When ``after_id`` is given, ``offset`` is ignored and rows
+    are always ordered by id. Results are served from ``query_cache`` unless
+    ``use_cache`` is False.
+    """
+    source, where, params, ranked = _case_conditions(table_name, project_id, keyword, filters)
+    order = f"bm25({table_name}_fts), t.id" if ranked else "t.id"
+    if after_id is not None:
+        where += " AND t.id > ?"
+        params.append(after_id)
+        order = "t.id"
+    query = f"SELECT t.* FROM {source} WHERE {where} ORDER BY {order}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+        if after_id is None and offset:
+            query += " OFFSET ?"
+            params.append(offset)
+
+    async def load():
+        async with db_connection(op="list_cases") as conn:
+            cursor = await conn.execute(query, params)
+            rows = await cursor.fetchall()
+        return _rows_to_dicts(rows)
+
+    if not use_cache:
+        return await load()
+    key = ("list", keyword, _filters_key(filters), limit, offset, after_id)
+    return await query_cache.get_or_load(table_name, project_id, key, load)
+
+async def count_cases(table_name: str, project_id: int, keyword: str | None = None, filters: dict | None = None) -> int:
+    source, where, params, _ = _case_conditions(table_name, project_id, keyword, filters)
+
+    async def load():
+        async with db_connection(op="count_cases") as conn:
+            cursor = await conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params)
+            row = await cursor.fetchone()
+        return row[0]
+
+    key = ("count", keyword, _filters_key(filters))
+    return await query_cache.get_or_load(table_name, project_id, key, load)
 
 async def create_case(table_name: str, project_id: int, case_data: dict, id_field: str = "id") -> dict:
-    conn = await get_db_connection()
-
-    async with conn.execute(f"PRAGMA table_info({table_name});") as cursor:
-        valid_columns = {row['name'] for row in await cursor.fetchall()}
+    async with db_connection(write=True, op="create_case") as conn:
+        schema = await table_schema(conn, table_name)
 
-    case_data['project_id'] = project_id
-    filtered_data = {k: v for k, v in case_data.items() if k in valid_columns}
+        case_data['project_id'] = project_id
+        filtered_data = schema.writable(case_data)
 
-    columns = ', '.join(filtered_data.keys())
-    placeholders = ', '.join('?' for _ in filtered_data)
-
-    query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-    cursor = await conn.cursor()
-    await cursor.execute(query, list(filtered_data.values()))
-    new_id = cursor.lastrowid
-    await conn.commit()
-    await conn.close()
+        query = schema.insert_sql(tuple(filtered_data))
+        cursor = await conn.execute(query, list(filtered_data.values()))
+        new_id = cursor.lastrowid
+    query_cache.bump(table_name, project_id)
 
     case_data[id_field] = new_id
     return case_data
 
 async def update_case(table_name: str, project_id: int, case_id: int, case_data: dict, id_field: str = "id") -> Optional[dict]:
-    conn = await get_db_connection()
-    async with conn.execute(f"PRAGMA table_info({table_name});") as cursor:
-        valid_columns = {row['name'] for row in await cursor.fetchall()}
-
-    filtered_data = {k: v for k, v in case_data.items() if k in valid_columns and k != id_field}
-
-    if not filtered_data:
-        await conn.close()
-        return await get_case(table_name, project_id, case_id, id_field)
-
-    set_clause = ', '.join(f"{key} = ?" for key in filtered_data.keys())
-    query = f"UPDATE {table_name} SET {set_clause} WHERE {id_field} = ? AND project_id = ?"
-
-    params = list(filtered_data.values()) + [case_id, project_id]
-
-    cursor = await conn.cursor()
-    await cursor.execute(query, params)
-    await conn.commit()
-
-    updated = cursor.rowcount > 0
-    await conn.close()
-
-    if updated:
-        return await get_case(table_name, project_id, case_id, id_field)
-    return None
+    async with db_connection(write=True, op="update_case") as conn:
+        schema = await table_schema(conn, table_name)
+        filtered_data = schema.writable(case_data, exclude=(id_field,))
+
+        if filtered_data:
+            query = schema.update_sql(tuple(filtered_data), id_field)
+            params = list(filtered_data.values()) + [case_id, project_id]
+
+            cursor = await conn.execute(query, params)
+            if cursor.rowcount <= 0:
+                return None
+
+        # Read back on the writer so the caller sees its own uncommitted change
+        cursor = await conn.execute(f"SELECT * FROM {table_name} WHERE {id_field} = ? AND project_id = ?", (case_id, project_id))
+        updated = _row_to_dict(await cursor.fetchone())
+    # Bump only after commit, or a concurrent read could cache the old row under the new version
+    query_cache.bump(table_name, project_id)
+    return updated
+
+async def iter_cases(table_name: str, project_id: int, batch_size: int = 1000) -> AsyncIterator[list]:
+    """
+    Yield every row of a project-scoped table in id order, ``batch_size`` rows at a time.
+
+    Batches are fetched by keyset (``id > last_id``) and the pooled connection is
+    returned between batches, so a long export neither pins a reader nor holds
+    a read transaction open that would stop WAL checkpoints.
+    """
+    after_id = None
+    while True:
+        rows = await list_cases(table_name, project_id, limit=batch_size, after_id=after_id, use_cache=False)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1]["id"]
+
+# Natural keys used to match imported rows against existing cases when upserting.
+# API cases have no test_step, so a request is identified by feature, method and path.
+UPSERT_KEYS = {
+    "web_cases": ("test_feature", "test_step"),
+    "app_cases": ("test_feature", "test_step"),
+    "api_cases": ("test_feature", "method", "api_path"),
+}
+
+async def _existing_ids(conn, table_name: str, project_id: int, key_fields: tuple, keys: list) -> dict:
+    """Map natural key tuples to existing row ids for one chunk of imported rows."""
+    row_values = ", ".join("(" + ", ".join("?" for _ in key_fields) + ")" for _ in keys)
+    query = (
+        f"SELECT id, {', '.join(key_fields)} FROM {table_name} "
+        f"WHERE project_id = ? AND ({', '.join(key_fields)}) IN (VALUES {row_values})"
+    )
+    params = [project_id] + [v for key in keys for v in key]
+    cursor = await conn.execute(query, params)
+    return {tuple(row[1:]): row[0] for row in await cursor.fetchall()}
+
+async def bulk_write_cases(
+    table_name: str,
+    project_id: int,
+    rows: Sequence[dict],
+    upsert: bool = False,
+    defaults: Optional[dict] = None,
+    chunk_size: int = 300,
+) -> dict:
+    """
+    Insert (or upsert) many cases in a single write transaction.
+
+    ``rows`` must already be validated: the writer connection is held only for
+    the ``executemany`` calls, ``chunk_size`` rows at a time, and a failure
+    rolls back the whole import. With ``upsert`` rows whose ``UPSERT_KEYS``
+    match an existing case in the project update it instead of inserting;
+    within a chunk the last row for a key wins. ``defaults`` fill in missing
+    fields of inserted rows only, so an update touches just the fields the
+    row provides. Returns ``{"inserted": n, "updated": m}``.
+    """
+    key_fields = UPSERT_KEYS.get(table_name) if upsert else None
+    defaults = defaults or {}
+    inserted = updated = 0
+
+    def row_key(row: dict) -> tuple:
+        return tuple(row.get(k, defaults.get(k)) for k in key_fields)
+
+    async def flush(conn, schema, chunk: list) -> None:
+        nonlocal inserted, updated
+        existing: dict = {}
+        if key_fields:
+            latest = {row_key(r): r for r in chunk}
+            chunk = list(latest.values())
+            existing = await _existing_ids(conn, table_name, project_id, key_fields, list(latest))
+        inserts: dict = {}
+        updates: dict = {}
+        for row in chunk:
+            row_id = existing.get(row_key(row)) if key_fields else None
+            if row_id is None:
+                data = schema.writable({**defaults, **row}, exclude=("id",))
+                data["project_id"] = project_id
+                inserts.setdefault(tuple(data), []).append(list(data.values()))
+            else:
+                data = schema.writable(row, exclude=("id", "project_id"))
+                updates.setdefault(tuple(data), []).append(list(data.values()) + [row_id, project_id])
+        for columns, params in inserts.items():
+            await conn.executemany(schema.insert_sql(columns), params)
+            inserted += len(params)
+        for columns, params in updates.items():
+            await conn.executemany(schema.update_sql(columns), params)
+            updated += len(params)
+
+    if not rows:
+        return {"inserted": 0, "updated": 0}
+    async with db_connection(write=True, op="bulk_write_cases") as conn:
+        schema = await table_schema(conn, table_name)
+        for start in range(0, len(rows), chunk_size):
+            await flush(conn, schema, rows[start:start + chunk_size])
+    query_cache.bump(table_name, project_id)
+    return {"inserted": inserted, "updated": updated}
 
 async def get_case(table_name: str, project_id: int, case_id: int, id_field: str = "id") -> Optional[dict]:
-    conn = await get_db_connection()
-    cursor = await conn.execute(f"SELECT * FROM {table_name} WHERE {id_field} = ? AND project_id = ?", (case_id, project_id))
-    row = await cursor.fetchone()
-    await conn.close()
+    async with db_connection(op="get_case") as conn:
+        cursor = await conn.execute(f"SELECT * FROM {table_name} WHERE {id_field} = ? AND project_id = ?", (case_id, project_id))
+        row = await cursor.fetchone()
     return _row_to_dict(row)
 
 async def delete_case(table_name: str, project_id: int, case_id: int, id_field: str = "id") -> bool:
-    conn = await get_db_connection()
-    cursor = await conn.cursor()
-    await cursor.execute(f"DELETE FROM {table_name} WHERE {id_field} = ? AND project_id = ?", (case_id, project_id))
-    await conn.commit()
-    deleted = cursor.rowcount > 0
-    await conn.close()
+    async with db_connection(write=True, op="delete_case") as conn:
+        cursor = await conn.execute(f"DELETE FROM {table_name} WHERE {id_field} = ? AND project_id = ?", (case_id, project_id))
+        deleted = cursor.rowcount > 0
+    query_cache.bump(table_name, project_id)
     return deleted
 
 # ---- App Device Info ----
 async def get_app_device(project_id: int) -> str:
-    conn = await get_db_connection()
-    cursor = await conn.execute("SELECT device_info FROM app_device_info WHERE project_id = ?", (project_id,))
-    row = await cursor.fetchone()
-    await conn.close()
+    async with db_connection(op="get_app_device") as conn:
+        cursor = await conn.execute("SELECT device_info FROM app_device_info WHERE project_id = ?", (project_id,))
+        row = await cursor.fetchone()
     return row['device_info'] if row else ""
 
 async def set_app_device(project_id: int, text: str) -> None:
-    conn = await get_db_connection()
-    await conn.execute("INSERT OR REPLACE INTO app_device_info (project_id, device_info) VALUES (?, ?)", (project_id, text))
-    await conn.commit()
-    await conn.close()
+    async with db_connection(write=True, op="set_app_device") as conn:
+        await conn.execute("INSERT OR REPLACE INTO app_device_info (project_id, device_info) VALUES (?, ?)", (project_id, text))
 
 # ---- Project-Scoped Bugs ----
 async def list_project_bugs(project_id: int, keyword: Optional[str] = None, severity: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
-    conn = await get_db_connection()
-    query = "SELECT * FROM bugs WHERE project_id = ?"
-    params = [project_id]
-    if keyword:
-        kw = f"%{keyword.lower()}%"
-        query += " AND (LOWER(description) LIKE ? OR LOWER(repro) LIKE ? OR LOWER(expected) LIKE ? OR LOWER(actual) LIKE ?)"
-        params.extend([kw, kw, kw, kw])
+    """List bugs for a project. Keyword searches are ordered by relevance."""
+    source, where, params, ranked = _search_source('bugs', keyword)
+    where += " AND t.project_id = ?"
+    params.append(project_id)
     if severity:
-        query += " AND severity = ?"
+        where += " AND t.severity = ?"
         params.append(severity)
     if status:
-        query += " AND status = ?"
+        where += " AND t.status = ?"
         params.append(status)
+    order = "bm25(bugs_fts), t.id" if ranked else "t.id"
 
-    cursor = await conn.execute(query, params)
-    rows = await cursor.fetchall()
-    await conn.close()
-    return _rows_to_dicts(rows)
+    async def load():
+        async with db_connection(op="list_project_bugs") as conn:
+            cursor = await conn.execute(f"SELECT t.* FROM {source} WHERE {where} ORDER BY {order}", params)
+            rows = await cursor.fetchall()
+        return _rows_to_dicts(rows)
+
+    return await query_cache.get_or_load('bugs', project_id, ("list", keyword, severity, status), load)
 
 async def create_project_bug(project_id: int, bug_data: dict) -> dict:
     bug_data['project_id'] = project_id
@@ -148,8 +333,8 @@ async def delete_project_bug(project_id: int, bug_id: int) -> bool:
 
 # ---- Projects (Global) ----
 async def list_projects(keyword: Optional[str] = None, owner: Optional[str] = None, status: Optional[str] = None):
-    conn = await get_db_connection()
-    query = "SELECT * FROM projects WHERE 1=1"
+    # Projects being purged in the background are already gone for the UI.
+    query = "SELECT * FROM projects WHERE deleting = 0"
     params = []
     if keyword:
         kw = f"%{keyword.lower()}%"
@@ -162,86 +347,205 @@ async def list_projects(keyword: Optional[str] = None, owner: Optional[str] = No
         query += " AND status = ?"
         params.append(status)
 
-    cursor = await conn.execute(query, params)
-    rows = await cursor.fetchall()
-    await conn.close()
-    return _rows_to_dicts(rows)
+    async def load():
+        async with db_connection(op="list_projects") as conn:
+            cursor = await conn.execute(query, params)
+            rows = await cursor.fetchall()
+        return _rows_to_dicts(rows)
+
+    return await query_cache.get_or_load("projects", None, ("list", keyword, owner, status), load)
+
+async def _fetch_project(conn, project_id: int):
+    cursor = await conn.execute("SELECT * FROM projects WHERE id = ? AND deleting = 0", (project_id,))
+    return _row_to_dict(await cursor.fetchone())
 
 async def get_project(project_id: int):
-    conn = await get_db_connection()
-    cursor = await conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,))
-    row = await cursor.fetchone()
-    await conn.close()
-    return _row_to_dict(row)
+    async with db_connection(op="get_project") as conn:
+        return await _fetch_project(conn, project_id)
 
 async def create_project(data: dict):
-    conn = await get_db_connection()
-    cursor = await conn.cursor()
-    await cursor.execute(
-        "INSERT INTO projects (name, description, owner, status) VALUES (?, ?, ?, ?)",
-        (data.get("name", ""), data.get("description", ""), data.get("owner", ""), data.get("status", "新增"))
-    )
-    new_id = cursor.lastrowid
-    await conn.commit()
-    await conn.close()
-    return await get_project(new_id)
+    async with db_connection(write=True, op="create_project") as conn:
+        cursor = await conn.execute(
+            "INSERT INTO projects (name, description, owner, status) VALUES (?, ?, ?, ?)",
+            (data.get("name", ""), data.get("description", ""), data.get("owner", ""), data.get("status", "新增"))
+        )
+        project = await _fetch_project(conn, cursor.lastrowid)
+    query_cache.bump("projects")
+    return project
 
 async def update_project(project_id: int, data: dict):
-    conn = await get_db_connection()
-    await conn.execute(
-        "UPDATE projects SET name = ?, description = ?, owner = ?, status = ? WHERE id = ?",
-        (data.get("name"), data.get("description"), data.get("owner"), data.get("status"), project_id)
-    )
-    await conn.commit()
-    await conn.close()
-    return await get_project(project_id)
-
-async def delete_project(project_id: int):
-    conn = await get_db_connection()
-    await conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
-    await conn.execute("DELETE FROM web_cases WHERE project_id = ?", (project_id,))
-    await conn.execute("DELETE FROM app_cases WHERE project_id = ?", (project_id,))
-    await conn.execute("DELETE FROM api_cases WHERE project_id = ?", (project_id,))
-    await conn.execute("DELETE FROM bugs WHERE project_id = ?", (project_id,))
-    await conn.execute("DELETE FROM app_device_info WHERE project_id = ?", (project_id,))
-    await conn.commit()
-    await conn.close()
-    return True
+    async with db_connection(write=True, op="update_project") as conn:
+        await conn.execute(
+            "UPDATE projects SET name = ?, description = ?, owner = ?, status = ? WHERE id = ?",
+            (data.get("name"), data.get("description"), data.get("owner"), data.get("status"), project_id)
+        )
+        project = await _fetch_project(conn, project_id)
+    query_cache.bump("projects")
+    return project
+
+async def mark_project_deleting(project_id: int) -> bool:
+    """Hide a project from listings ahead of a background purge. False if it does not exist."""
+    async with db_connection(write=True, op="mark_project_deleting") as conn:
+        cursor = await conn.execute("UPDATE projects SET deleting = 1 WHERE id = ?", (project_id,))
+        marked = cursor.rowcount > 0
+    query_cache.bump("projects")
+    return marked
+
+async def is_project_deleting(project_id: int) -> bool:
+    async with db_connection(op="is_project_deleting") as conn:
+        cursor = await conn.execute("SELECT 1 FROM projects WHERE id = ? AND deleting = 1", (project_id,))
+        return await cursor.fetchone() is not None
+
+async def list_deleting_projects() -> List[int]:
+    """Projects whose purge was interrupted (e.g. by a restart) and must be resumed."""
+    async with db_connection(op="list_deleting_projects") as conn:
+        cursor = await conn.execute("SELECT id FROM projects WHERE deleting = 1")
+        rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+async def list_project_screenshots(project_id: int) -> List[str]:
+    async with db_connection(op="list_project_screenshots") as conn:
+        cursor = await conn.execute(
+            "SELECT screenshot FROM bugs WHERE project_id = ? AND screenshot IS NOT NULL AND screenshot != ''",
+            (project_id,),
+        )
+        rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+async def purge_project_rows(project_id: int, batch_size: int = 2000) -> AsyncIterator[tuple]:
+    """
+    Delete a project's rows in small write transactions, yielding ``(table, deleted)``
+    after each batch so the caller can report progress.
+
+    Other writers get the lock between batches instead of waiting for one huge
+    DELETE. The project row goes last; its cascade removes anything created for
+    the project while the purge was running.
+    """
+    for table in PROJECT_CHILD_TABLES:
+        key = "project_id" if table == "app_device_info" else "id"
+        while True:
+            async with db_connection(write=True, op="purge_project_rows") as conn:
+                cursor = await conn.execute(
+                    f"DELETE FROM {table} WHERE {key} IN "
+                    f"(SELECT {key} FROM {table} WHERE project_id = ? LIMIT ?)",
+                    (project_id, batch_size),
+                )
+                deleted = cursor.rowcount
+            query_cache.bump(table, project_id)
+            if deleted <= 0:
+                break
+            yield table, deleted
+            if deleted < batch_size:
+                break
+    async with db_connection(write=True, op="purge_project_rows") as conn:
+        cursor = await conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        deleted = cursor.rowcount
+    _invalidate_project(project_id)
+    yield "projects", deleted
 
 # ---- Mocks ----
 async def get_all_mocks() -> List[Dict[str, Any]]:
-    conn = await get_db_connection()
-    cursor = await conn.execute("SELECT * FROM mocks ORDER BY id ASC")
-    rows = await cursor.fetchall()
-    await conn.close()
+    async with db_connection(op="get_all_mocks") as conn:
+        cursor = await conn.execute("SELECT * FROM mocks ORDER BY id ASC")
+        rows = await cursor.fetchall()
 
     mocks = _rows_to_dicts(rows)
     for mock in mocks:
         if mock.get('params'): mock['params'] = json.loads(mock['params'])
         if mock.get('headers'): mock['headers'] = json.loads(mock['headers'])
         if mock.get('response_headers'): mock['response_headers'] = json.loads(mock['response_headers'])
+        if mock.get('latency_profile'): mock['latency_profile'] = json.loads(mock['latency_profile'])
+        if mock.get('faults'): mock['faults'] = json.loads(mock['faults'])
+        if mock.get('body_match'): mock['body_match'] = json.loads(mock['body_match'])
+        mock['static_response'] = bool(mock.get('static_response'))
     return mocks
 
+async def get_mocks_revision() -> int:
+    """Revision counter bumped by triggers whenever the mocks table changes."""
+    async with db_connection(op="get_mocks_revision") as conn:
+        async with conn.execute("SELECT value FROM meta WHERE key = 'mocks_revision'") as cursor:
+            row = await cursor.fetchone()
+    return row[0] if row else 0
+
 async def save_mock(mock_config: Dict[str, Any]) -> Dict[str, Any]:
-    conn = await get_db_connection()
-    params = json.dumps(mock_config.get('params', []))
-    headers = json.dumps(mock_config.get('headers', []))
-    response_headers = json.dumps(mock_config.get('response_headers', []))
-
-    query = "INSERT INTO mocks (path, method, params, headers, body, response_status, response_headers, response_body, delay_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
-    cursor = await conn.cursor()
-    await cursor.execute(query, (
-        mock_config.get('path'), mock_config.get('method'), params, headers,
-        mock_config.get('body'), mock_config.get('response_status'),
-        response_headers, mock_config.get('response_body'), mock_config.get('delay_ms')
-    ))
-
-    new_id = cursor.lastrowid
-    await conn.commit()
-    await conn.close()
-
-    mock_config['id'] = new_id
-    return mock_config
+    return (await save_mocks([mock_config]))[0]
+
+async def save_mocks(mock_configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert several mocks in one write transaction; each dict gets its new ``id``."""
+    query = (
+        "INSERT INTO mocks (path, method, params, headers, body, response_status, response_headers, response_body, "
+        "delay_ms, latency_profile, bandwidth_kbps, faults, body_file, body_match, static_response) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    async with db_connection(write=True, op="save_mocks") as conn:
+        for mock_config in mock_configs:
+            params = json.dumps(mock_config.get('params', []))
+            headers = json.dumps(mock_config.get('headers', []))
+            response_headers = json.dumps(mock_config.get('response_headers', []))
+            latency_profile = json.dumps(mock_config['latency_profile']) if mock_config.get('latency_profile') else None
+            faults = json.dumps(mock_config['faults']) if mock_config.get('faults') else None
+            body_match = json.dumps(mock_config['body_match']) if mock_config.get('body_match') else None
+            cursor = await conn.execute(query, (
+                mock_config.get('path'), mock_config.get('method'), params, headers,
+                mock_config.get('body'), mock_config.get('response_status'),
+                response_headers, mock_config.get('response_body'), mock_config.get('delay_ms'),
+                latency_profile, mock_config.get('bandwidth_kbps'), faults, mock_config.get('body_file'),
+                body_match, int(bool(mock_config.get('static_response')))
+            ))
+            mock_config['id'] = cursor.lastrowid
+    return mock_configs
+
+async def save_mock_journal(entries: List[Dict[str, Any]], keep: int = 100000) -> None:
+    """Append journal entries in one transaction and trim the table to ``keep`` rows."""
+    pid = os.getpid()
+    rows = [
+        (e["ts"], pid, e["method"], e["path"], e["query"], json.dumps(e["headers"]),
+         e["body_digest"], e["mock_id"], e["status"], e["latency_ms"])
+        for e in entries
+    ]
+    async with db_connection(write=True, op="save_mock_journal") as conn:
+        await conn.executemany(
+            "INSERT INTO mock_journal (ts, pid, method, path, query, headers, body_digest, mock_id, status, latency_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        await conn.execute("DELETE FROM mock_journal WHERE id <= (SELECT MAX(id) FROM mock_journal) - ?", (keep,))
+
+async def list_mock_journal(
+    method: Optional[str] = None,
+    path: Optional[str] = None,
+    mock_id: Optional[int] = None,
+    matched: Optional[bool] = None,
+    status: Optional[int] = None,
+    since: Optional[float] = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Newest-first persisted journal entries from every mock server process."""
+    where, params = "1 = 1", []
+    if method:
+        where += " AND method = ?"
+        params.append(method.upper())
+    if path:
+        where += " AND instr(path, ?) > 0"
+        params.append(path)
+    if mock_id is not None:
+        where += " AND mock_id = ?"
+        params.append(mock_id)
+    if matched is not None:
+        where += " AND mock_id IS NOT NULL" if matched else " AND mock_id IS NULL"
+    if status is not None:
+        where += " AND status = ?"
+        params.append(status)
+    if since is not None:
+        where += " AND ts >= ?"
+        params.append(since)
+    params.append(limit)
+    async with db_connection(op="list_mock_journal") as conn:
+        cursor = await conn.execute(f"SELECT * FROM mock_journal WHERE {where} ORDER BY id DESC LIMIT ?", params)
+        rows = _rows_to_dicts(await cursor.fetchall())
+    for row in rows:
+        row["headers"] = json.loads(row["headers"]) if row.get("headers") else {}
+    return rows
 
 # ---- Dummy legacy functions ----
 def list_bugs(*args, **kwargs): return []
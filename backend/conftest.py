@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# The app reads DATA_DIR at import time; keep test databases and files out of ./data.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="test-platform-"))
@@ -0,0 +1,30 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.database import DATA_DIR
+from app.main import app
+from app.mock_files import MOCK_FILE_CHUNK_SIZE
+
+
+def _body_file(name: str, size: int) -> bytes:
+    data = os.urandom(size)
+    with open(os.path.join(DATA_DIR, name), "wb") as f:
+        f.write(data)
+    return data
+
+
+def test_multi_chunk_body_file_through_platform_app():
+    data = _body_file("multi_chunk.bin", MOCK_FILE_CHUNK_SIZE * 2 + 1234)
+    with TestClient(app) as client:
+        created = client.post("/api/mock", json={"path": "/files/multi-chunk", "body_file": "multi_chunk.bin"})
+        assert created.status_code == 200
+        response = client.get("/files/multi-chunk")
+        assert response.status_code == 200
+        assert response.headers["content-length"] == str(len(data))
+        assert response.content == data
+
+        start, end = MOCK_FILE_CHUNK_SIZE - 10, MOCK_FILE_CHUNK_SIZE * 2 + 10
+        partial = client.get("/files/multi-chunk", headers={"Range": f"bytes={start}-{end}"})
+        assert partial.status_code == 206
+        assert partial.content == data[start:end + 1]
@@ -1,18 +1,44 @@
 
+import asyncio
 import os
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlencode
 import httpx
 
 def base_url() -> str:
     return os.getenv("BACKEND_URL") or "http://127.0.0.1:8000"
 
+# ---- Conditional GET cache ----
+# Last ETag and body per list URL. The backend answers 304 when nothing changed,
+# and the stored body is reused instead of downloading the same JSON again.
+_ETAG_CACHE_SIZE = 256
+_etag_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+async def _get_json_cached(client: httpx.AsyncClient, url: str, params: dict | None = None):
+    key = url + "?" + urlencode(sorted((params or {}).items()))
+    cached = _etag_cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = await client.get(url, params=params, headers=headers)
+    if r.status_code == 304 and cached:
+        _etag_cache.move_to_end(key)
+        return cached[1]
+    r.raise_for_status()
+    body = r.json()
+    etag = r.headers.get("ETag")
+    if etag:
+        _etag_cache[key] = (etag, body)
+        _etag_cache.move_to_end(key)
+        if len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return body
+
 # ---- Projects ----
 async def list_projects(keyword: str = "", owner: str = "", status: str = ""):
     params = {"q": keyword, "owner": owner, "status": status}
     params = {k: v for k, v in params.items() if v}
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects", params=params)
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects", params)
 
 async def create_project(payload: dict):
     async with httpx.AsyncClient(timeout=15.0) as client:
@@ -51,30 +77,78 @@ async def create_mock(config: dict):
 # ---- Case Names ----
 async def list_web_case_names(project_id: int):
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/webcases/names")
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/webcases/names")
 
 async def list_app_case_names(project_id: int):
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/appcases/names")
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/appcases/names")
 
 async def list_api_case_names(project_id: int):
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/apicases/names")
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/apicases/names")
 
 # ---- Logging ----
+# UI actions are buffered and sent to /log-actions in batches, every
+# ACTION_LOG_FLUSH_INTERVAL seconds or once ACTION_LOG_BATCH_SIZE are waiting,
+# over one shared connection. At most ACTION_LOG_BUFFER_MAX are kept while the
+# backend is unreachable; older ones are dropped first.
+ACTION_LOG_BATCH_SIZE = int(os.getenv("ACTION_LOG_BATCH_SIZE", "20"))
+ACTION_LOG_FLUSH_INTERVAL = float(os.getenv("ACTION_LOG_FLUSH_INTERVAL", "2.0"))
+ACTION_LOG_BUFFER_MAX = int(os.getenv("ACTION_LOG_BUFFER_MAX", "1000"))
+
+_action_buffer: "deque[dict]" = deque(maxlen=ACTION_LOG_BUFFER_MAX)
+_action_client: httpx.AsyncClient | None = None
+_action_task: asyncio.Task | None = None
+_action_lock: asyncio.Lock | None = None
+_actions_dropped = 0
+
+async def _action_flusher():
+    while True:
+        await asyncio.sleep(ACTION_LOG_FLUSH_INTERVAL)
+        await flush_actions()
+
+async def flush_actions():
+    """Send buffered actions in one request; on failure they stay buffered for the next try."""
+    global _action_client, _action_lock
+    if _action_lock is None:
+        _action_lock = asyncio.Lock()
+    async with _action_lock:
+        if not _action_buffer:
+            return
+        batch = list(_action_buffer)
+        dropped_before = _actions_dropped
+        try:
+            if _action_client is None:
+                _action_client = httpx.AsyncClient(timeout=5.0)
+            r = await _action_client.post(f"{base_url()}/log-actions", json=batch)
+            r.raise_for_status()
+        except Exception:
+            # Fail silently if logging fails
+            return
+        # Actions that overflowed the buffer meanwhile were the oldest, i.e. part of this batch
+        for _ in range(max(0, len(batch) - (_actions_dropped - dropped_before))):
+            _action_buffer.popleft()
+
 async def log_action(action: str):
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            await client.post(f"{base_url()}/log-action", json={"action": action})
-    except Exception:
-        # Fail silently if logging fails
-        pass
+    global _action_task, _actions_dropped
+    if len(_action_buffer) == _action_buffer.maxlen:
+        _actions_dropped += 1
+    _action_buffer.append({"action": action, "ts": time.time()})
+    if _action_task is None or _action_task.done():
+        _action_task = asyncio.create_task(_action_flusher())
+    if len(_action_buffer) >= ACTION_LOG_BATCH_SIZE:
+        await flush_actions()
+
+async def close_action_log():
+    """Flush pending actions and close the shared client (app shutdown)."""
+    global _action_client, _action_task
+    if _action_task is not None:
+        _action_task.cancel()
+        _action_task = None
+    await flush_actions()
+    if _action_client is not None:
+        await _action_client.aclose()
+        _action_client = None
 
 # ---- Cases ----
 async def list_web_cases(project_id: int, keyword: str = "", action: str = "", result: str = ""):
@@ -82,9 +156,7 @@ async def list_web_cases(project_id: int, keyword: str = "", action: str = "", r
     # Remove empty values
     params = {k: v for k, v in params.items() if v}
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/webcases", params=params)
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/webcases", params)
 
 async def create_web_case(project_id: int, payload: dict):
     async with httpx.AsyncClient(timeout=15.0) as client:
@@ -109,9 +181,7 @@ async def list_app_cases(project_id: int, keyword: str = "", action: str = "", r
     params = {"q": keyword, "action": action, "result": result}
     params = {k: v for k, v in params.items() if v}
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/appcases", params=params)
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/appcases", params)
 
 async def create_app_case(project_id: int, payload: dict):
     async with httpx.AsyncClient(timeout=15.0) as client:
@@ -136,9 +206,7 @@ async def list_api_cases(project_id: int, keyword: str = "", method: str = "", r
     params = {"q": keyword, "method": method, "result": result}
     params = {k: v for k, v in params.items() if v}
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/apicases", params=params)
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/apicases", params)
 
 async def create_api_case(project_id: int, payload: dict):
     async with httpx.AsyncClient(timeout=15.0) as client:
@@ -163,9 +231,7 @@ async def list_project_bugs(project_id: int, keyword: str = "", severity: str =
     params = {"q": keyword, "severity": severity, "status": status}
     params = {k: v for k, v in params.items() if v}
     async with httpx.AsyncClient(timeout=10.0) as client:
-        r = await client.get(f"{base_url()}/projects/{project_id}/bugs", params=params)
-        r.raise_for_status()
-        return r.json()
+        return await _get_json_cached(client, f"{base_url()}/projects/{project_id}/bugs", params)
 
 async def create_project_bug(project_id: int, payload: dict):
     async with httpx.AsyncClient(timeout=15.0) as client:
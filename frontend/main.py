@@ -154,6 +154,7 @@ async def startup_tasks():
     await load_initial_project()
 
 app.on_startup(startup_tasks)
+app.on_shutdown(api.close_action_log)
 
 if __name__ in {"__main__", "__mp_main__"}:
     port = int(os.environ.get('PORT', 8081))
@@ -3,8 +3,11 @@
 set -e
 # Start backend
 ( cd backend && uvicorn app.main:app --reload --port 8000 ) &
+# Start standalone mock server
+( cd backend && uvicorn app.mock_server:mock_app --port 8001 ) &
 # Start frontend
 ( cd frontend && python main.py ) &
 echo "Frontend: http://localhost:8080"
 echo "Backend : http://localhost:8000/docs"
+echo "Mocks   : http://localhost:8001"
 wait